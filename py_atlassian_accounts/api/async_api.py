@@ -0,0 +1,113 @@
+from api.async_http import AsyncHttp
+from api.groups import Groups
+from api.permission_schemes import PermissionSchemes
+from api.projects import Projects
+from api.spaces import Spaces
+
+from requests import Response
+
+jira = AsyncHttp.jira()
+confluence = AsyncHttp.confluence()
+
+# Async counterparts to the Groups, Projects, PermissionSchemes and Spaces methods.
+# Each coroutine runs its synchronous namesake on the site's AsyncHttp workers, so
+# the request, and any update to name_index or the scheme fingerprints, is the
+# same whichever is called. A batch of them can be awaited together with
+# gather_results, e.g.
+#     results = await gather_results(
+#         AsyncGroups.add_user_to_group(group_id, account_id)
+#         for account_id in roster
+#     )
+
+
+class AsyncGroups:
+    """
+    An object for manipulating Jira groups concurrently
+    """
+
+    @staticmethod
+    async def create_group(name: str) -> Response:
+        return await jira.call(Groups.create_group, name)
+
+    @staticmethod
+    async def delete_group(name: str) -> Response:
+        return await jira.call(Groups.delete_group, name)
+
+    @staticmethod
+    async def add_user_to_group(groupID: str, accountID: str) -> Response:
+        return await jira.call(Groups.add_user_to_group, groupID, accountID)
+
+    @staticmethod
+    async def remove_user_from_group(groupID: str, accountID: str) -> Response:
+        return await jira.call(Groups.remove_user_from_group, groupID, accountID)
+
+
+class AsyncProjects:
+    """
+    An object for manipulating Jira projects concurrently
+    """
+
+    @staticmethod
+    async def create_scrum_project(name: str, key: str) -> Response:
+        return await jira.call(Projects.create_scrum_project, name, key)
+
+    @staticmethod
+    async def delete_project(project_id_or_key: str) -> Response:
+        return await jira.call(Projects.delete_project, project_id_or_key)
+
+    @staticmethod
+    async def assign_permission_scheme_to_project(project_key_or_id: str, scheme_id: int) -> Response:
+        return await jira.call(Projects.assign_permission_scheme_to_project, project_key_or_id, scheme_id)
+
+    @staticmethod
+    async def create_project_role(name: str, description: str) -> Response:
+        return await jira.call(Projects.create_project_role, name, description)
+
+    @staticmethod
+    async def delete_project_role(role_id: str) -> Response:
+        return await jira.call(Projects.delete_project_role, role_id)
+
+    @staticmethod
+    async def add_actors_to_project_role(project_id_or_key: str, role_id: str,
+                                         group_ids: list[str], user_ids: list[str]) -> Response:
+        return await jira.call(Projects.add_actors_to_project_role, project_id_or_key, role_id,
+                               group_ids, user_ids)
+
+    @staticmethod
+    async def delete_user_from_project_role(project_id_or_key: str, role_id: str,
+                                            user_id: str) -> Response:
+        return await jira.call(Projects.delete_user_from_project_role, project_id_or_key, role_id, user_id)
+
+    @staticmethod
+    async def delete_group_from_project_role(project_id_or_key: str, role_id: str,
+                                             group_id: str) -> Response:
+        return await jira.call(Projects.delete_group_from_project_role, project_id_or_key, role_id, group_id)
+
+
+class AsyncPermissionSchemes:
+    """
+    Creates and removes the permission schemes built by PermissionSchemes concurrently
+    """
+
+    @staticmethod
+    async def create_permission_scheme(scheme: PermissionSchemes, description: str,
+                                       scheme_name: str) -> Response:
+        return await jira.call(scheme.create_permission_scheme, description, scheme_name)
+
+    @staticmethod
+    async def remove_permission_scheme(scheme_id: str) -> Response:
+        return await jira.call(PermissionSchemes.remove_permission_scheme, scheme_id)
+
+
+class AsyncSpaces:
+    """
+    Creates and deletes the Confluence spaces described by Spaces concurrently
+    """
+
+    @staticmethod
+    async def create_space(space: Spaces) -> Response:
+        return await confluence.call(space.create_space)
+
+    @staticmethod
+    async def delete_space(key: str) -> Response:
+        return await confluence.call(Spaces.delete_space, key)
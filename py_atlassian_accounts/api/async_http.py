@@ -0,0 +1,124 @@
+from api.http import Http, POOL_SIZE, confluence_url, jira_url
+import constants
+
+from requests import Response
+import asyncio
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Iterable
+
+# Maximum number of requests in flight per Atlassian site at any one time.
+# Can be overridden by defining CONCURRENCY in constants.py. A higher concurrency
+# grows the site's shared connection pool to match
+CONCURRENCY = getattr(constants, "CONCURRENCY", POOL_SIZE)
+
+
+class Result:
+    """
+    The outcome of one awaitable in a gather_results batch. Exactly one of
+    value or error is set
+    """
+
+    __slots__ = ("value", "error")
+
+    def __init__(self, value=None, error: BaseException | None = None):
+        self.value = value
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        """
+        True if the call completed and, for Responses, returned a non-error status
+        """
+        if self.error is not None:
+            return False
+        return not (isinstance(self.value, Response) and self.value.status_code >= 400)
+
+    def __repr__(self) -> str:
+        return f"Result(value={self.value!r}, error={self.error!r})"
+
+
+async def gather_results(aws: Iterable[Awaitable]) -> list[Result]:
+    """
+    Awaits a batch of API calls together and returns one Result per call, in the
+    same order as given. A failing call never cancels or hides the others, and a
+    call that was cancelled is reported as an error, not as a value
+    """
+    outcomes = await asyncio.gather(*aws, return_exceptions=True)
+    return [
+        Result(error=outcome) if isinstance(outcome, BaseException) else Result(outcome)
+        for outcome in outcomes
+    ]
+
+
+class AsyncHttp:
+    """
+    asyncio counterpart to Http
+
+    Each call is sent through the same pooled session as the synchronous Http client
+    for that site, on one of this instance's worker threads, so the event loop is
+    never blocked. At most
+    `concurrency` requests per AsyncHttp instance are in flight at once; any further
+    calls wait their turn. Share one instance per site to apply a per-site limit.
+
+    Queries and payloads are passed per call rather than built up on the client:
+        await jira.post("/rest/api/3/group", "Creating group...", payload={...})
+    """
+
+    def __init__(self, url: str, concurrency: int = CONCURRENCY, headers=None):
+        self.url = url
+        self.concurrency = concurrency
+        self.http = Http(url, headers=headers, pool_size=max(concurrency, POOL_SIZE))
+        # asyncio primitives are bound to the loop they are first used on, so
+        # keep one semaphore per running loop
+        self._semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency,
+                                            thread_name_prefix="AsyncHttp")
+
+    @staticmethod
+    def confluence(concurrency: int = CONCURRENCY):
+        return AsyncHttp(confluence_url(), concurrency)
+
+    @staticmethod
+    def jira(concurrency: int = CONCURRENCY):
+        return AsyncHttp(jira_url(), concurrency)
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.concurrency)
+        return semaphore
+
+    async def request(self, method: str, endpoint: str, desc: str = "",
+                      queries: dict | None = None, payload=None) -> Response:
+        """
+        Sends one request with its own queries and payload. method is one of
+        "get", "post", "put" or "delete"
+        """
+        client = self.http.add_queries(queries or {}).set_payload(payload)
+        return await self.call(getattr(client, method), endpoint, desc)
+
+    async def call(self, func: Callable[..., Response], *args) -> Response:
+        """
+        Runs a synchronous API function, e.g. Groups.create_group, on this instance's
+        worker threads within its concurrency limit. The function sends its request
+        exactly as it does when called directly, including any side effects such as
+        name_index updates
+        """
+        async with self._semaphore():
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def get(self, endpoint: str, desc: str = "", queries: dict | None = None) -> Response:
+        return await self.request("get", endpoint, desc, queries)
+
+    async def post(self, endpoint: str, desc: str = "", queries: dict | None = None,
+                   payload=None) -> Response:
+        return await self.request("post", endpoint, desc, queries, payload)
+
+    async def put(self, endpoint: str, desc: str = "", queries: dict | None = None,
+                  payload=None) -> Response:
+        return await self.request("put", endpoint, desc, queries, payload)
+
+    async def delete(self, endpoint: str, desc: str = "", queries: dict | None = None) -> Response:
+        return await self.request("delete", endpoint, desc, queries)
@@ -0,0 +1,116 @@
+import constants
+
+from requests import Response
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable
+
+# Default number of worker threads used by bulk operations.
+# Can be overridden by defining BULK_WORKERS in constants.py
+BULK_WORKERS = getattr(constants, "BULK_WORKERS", 10)
+
+
+class BulkResult:
+    """
+    The outcome of one item in a bulk operation
+        item - The arguments the API call was made with
+        response - The Response, or None if the call raised
+        error - The exception raised by the call, if any
+        skipped - True if the call was not needed and never sent
+    """
+
+    __slots__ = ("item", "response", "error", "skipped")
+
+    def __init__(self, item: tuple, response: Response | None = None,
+                 error: BaseException | None = None, skipped: bool = False):
+        self.item = item
+        self.response = response
+        self.error = error
+        self.skipped = skipped
+
+    @property
+    def status_code(self) -> int | None:
+        return self.response.status_code if self.response is not None else None
+
+    @property
+    def ok(self) -> bool:
+        if self.skipped:
+            return True
+        return self.error is None and self.response is not None and self.response.status_code < 400
+
+    def __repr__(self) -> str:
+        return f"BulkResult(item={self.item!r}, status_code={self.status_code}, error={self.error!r})"
+
+
+class BulkReport:
+    """
+    Per-item results of a bulk operation, in the order the items were given
+    """
+
+    def __init__(self, results: list[BulkResult]):
+        self.results = results
+
+    @property
+    def successes(self) -> list[BulkResult]:
+        return [result for result in self.results if result.ok]
+
+    @property
+    def failures(self) -> list[BulkResult]:
+        return [result for result in self.results if not result.ok]
+
+    def status_codes(self) -> dict[int | None, int]:
+        """
+        Counts results by status code. Calls that raised are counted under None
+        """
+        counts = {}
+        for result in self.results:
+            counts[result.status_code] = counts.get(result.status_code, 0) + 1
+        return counts
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    def __repr__(self) -> str:
+        return (f"BulkReport({len(self.successes)} succeeded, {len(self.failures)} failed, "
+                f"status codes {self.status_codes()})")
+
+
+def run_bulk(func: Callable[..., Response], items: Iterable[tuple],
+             max_workers: int = BULK_WORKERS,
+             on_result: Callable[[BulkResult], None] | None = None,
+             journal=None, key: Callable[..., str] | None = None,
+             check: Callable[..., bool] | None = None) -> BulkReport:
+    """
+    Calls func(*item) for every item on a thread pool of max_workers threads and
+    collects a BulkResult for each. Exceptions are recorded against their item
+    rather than raised, so one bad row never stops the rest of the batch.
+    on_result, if given, is called from the worker thread as each item finishes,
+    e.g. to report progress.
+
+    With a journal (see api/journal.py), every item is planned in it with one
+    fsync before any call is sent, and each call goes through Journal.run() under
+    the key key(*item). Items the journal already records as done are skipped,
+    and check(*item) re-checks items left unfinished by an earlier run
+    """
+    run = func
+    if journal is not None:
+        items = list(items)
+        journal.plan(key(*item) for item in items)
+
+        def run(*item) -> Response | None:
+            return journal.run(key(*item), func, *item, check=check)
+
+    def call(item: tuple) -> BulkResult:
+        try:
+            response = run(*item)
+            if response is None and journal is not None:
+                result = BulkResult(item, skipped=True)
+            else:
+                result = BulkResult(item, response)
+        except Exception as e:
+            result = BulkResult(item, error=e)
+        if on_result is not None:
+            on_result(result)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bulk") as executor:
+        return BulkReport(list(executor.map(call, items)))
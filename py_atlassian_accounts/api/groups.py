@@ -1,7 +1,15 @@
+from api.bulk import BULK_WORKERS, BulkReport, run_bulk
 from api.http import Http
+from api.membership_store import FAILED, FETCHED, UNCHANGED, MembershipStore
+from api import name_index
+from api.pagination import JIRA_PAGE_SIZE, iter_jira
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from requests import Response
-import json
+from typing import Iterable, Iterator
+import logging
+
+logger = logging.getLogger(__name__)
 
 http = Http.jira()
 
@@ -16,23 +24,31 @@ class Groups:
         """
         https://developer.atlassian.com/cloud/jira/platform/rest/v3/api-group-groups/#api-rest-api-3-group-post
         """
-        return http.set_payload({
+        response = http.set_payload({
                 "name": name
             }
         ).post(
             "/rest/api/3/group",
             f"Creating a group with name {name} in Jira."
         )
+        if response.ok:
+            name_index.groups.add(name, response.json()["groupId"])
+        return response
 
     @staticmethod
     def delete_group(name: str) -> Response:
         """
         https://developer.atlassian.com/cloud/jira/platform/rest/v3/api-group-groups/#api-rest-api-3-group-delete
         """
-        return http.delete(
+        response = http.add_queries({
+            "groupname": name
+        }).delete(
             "/rest/api/3/group",
-            f"Creating a group with name {name} in Jira."
+            f"Deleting a group with name {name} in Jira."
         )
+        if response.ok:
+            name_index.groups.discard(name)
+        return response
 
     @staticmethod
     def add_user_to_group(groupID: str, accountID: str) -> Response:
@@ -41,9 +57,9 @@ class Groups:
         """
         return http.add_queries({
             "groupId": groupID
-        }).set_payload(json.dumps({
+        }).set_payload({
             "accountId": accountID
-        })).post(
+        }).post(
             "/rest/api/3/group/user",
             f"Adding user with account ID {accountID} to group with ID {groupID} in Jira.",
         )
@@ -60,3 +76,132 @@ class Groups:
             "/rest/api/3/group/user",
             f"Removing user with account ID {accountID} from group with ID {groupID} in Jira."
         )
+
+    @staticmethod
+    def get_group_members(groupID: str, start_at: int = 0, max_results: int = 50) -> Response:
+        """
+        Returns one page of the members of a group
+        https://developer.atlassian.com/cloud/jira/platform/rest/v3/api-group-groups/#api-rest-api-3-group-member-get
+        """
+        return http.add_queries({
+            "groupId": groupID,
+            "startAt": start_at,
+            "maxResults": max_results,
+        }).get(
+            "/rest/api/3/group/member",
+            f"Getting members {start_at} to {start_at + max_results} of group with ID {groupID} in Jira."
+        )
+
+    @staticmethod
+    def iter_group_members(groupID: str, prefetch: bool = False, start_at: int = 0,
+                           cached: bool = True) -> Iterator[dict]:
+        """
+        Lazily yields every member of a group from member start_at, fetching one page
+        at a time. With prefetch, the next page is requested while the current one
+        is processed. With cached=False, no page is read from the request cache
+        https://developer.atlassian.com/cloud/jira/platform/rest/v3/api-group-groups/#api-rest-api-3-group-member-get
+        """
+        return iter_jira(
+            "/rest/api/3/group/member",
+            f"Getting members of group with ID {groupID} in Jira.",
+            {"groupId": groupID},
+            prefetch=prefetch,
+            client=http if cached else http.uncached(),
+            start_at=start_at
+        )
+
+    @staticmethod
+    def get_group_member_ids(groupID: str, cached: bool = True) -> set[str]:
+        """
+        Returns the account IDs of every member of a group
+        """
+        return {member["accountId"] for member in Groups.iter_group_members(groupID, prefetch=True,
+                                                                             cached=cached)}
+
+    @staticmethod
+    def iter_groups(prefetch: bool = False) -> Iterator[dict]:
+        """
+        Lazily yields every group in Jira
+        https://developer.atlassian.com/cloud/jira/platform/rest/v3/api-group-groups/#api-rest-api-3-group-bulk-get
+        """
+        return iter_jira("/rest/api/3/group/bulk", "Listing groups in Jira.",
+                         prefetch=prefetch, client=http)
+
+    @staticmethod
+    def bulk_add_users_to_groups(pairs: Iterable[tuple[str, str]],
+                                 max_workers: int = BULK_WORKERS) -> BulkReport:
+        """
+        :param pairs: (groupId, accountId) tuples of the users to add
+        :param int max_workers: The number of requests to run at once
+        Adds every user to their group on a thread pool and returns a BulkReport
+        of the result for each pair, instead of raising on the first failure
+        """
+        return run_bulk(Groups.add_user_to_group, pairs, max_workers)
+
+    @staticmethod
+    def bulk_remove_users_from_groups(pairs: Iterable[tuple[str, str]],
+                                      max_workers: int = BULK_WORKERS) -> BulkReport:
+        """
+        :param pairs: (groupId, accountId) tuples of the users to remove
+        :param int max_workers: The number of requests to run at once
+        Removes every user from their group on a thread pool and returns a
+        BulkReport of the result for each pair
+        """
+        return run_bulk(Groups.remove_user_from_group, pairs, max_workers)
+
+    @staticmethod
+    def _fetch_membership(groupID: str, known_count: int | None, full: bool) -> tuple[int, list[dict] | None]:
+        """
+        Returns a group's member count and its members, or None for the members if
+        the count matches known_count and the group spans more than one page. Groups
+        that fit on one page are always returned, as that page is fetched anyway
+        """
+        response = Groups.get_group_members(groupID, 0, JIRA_PAGE_SIZE)
+        response.raise_for_status()
+        page = response.json()
+        members = page.get("values", [])
+        total = page.get("total", len(members))
+        if page.get("isLast", total <= len(members)):
+            return total, members
+        if not full and total == known_count:
+            return total, None
+        # Carry on after the first page rather than fetching it again
+        members.extend(Groups.iter_group_members(groupID, prefetch=True, start_at=len(members)))
+        return total, members
+
+    @staticmethod
+    def export_membership(group_ids: Iterable[str], store: MembershipStore, full: bool = False,
+                          max_workers: int = BULK_WORKERS) -> dict[str, str]:
+        """
+        :param group_ids: The groups to export
+        :param MembershipStore store: The SQLite store to export into
+        :param bool full: Re-fetch every group, even if it looks unchanged
+        Exports the members of each group into store, fetching groups on max_workers
+        threads. Later exports are incremental: Jira groups have no version, so a group
+        spanning several pages is only re-fetched if its member count has changed
+        since the last export. Use full=True to catch members swapped one for one.
+        Returns FETCHED, UNCHANGED or FAILED for each group
+        """
+        outcomes = {}
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="membership") as executor:
+            futures = {
+                executor.submit(Groups._fetch_membership, group_id, store.member_count(group_id), full): group_id
+                for group_id in dict.fromkeys(group_ids)
+            }
+            # The store is written from this thread only, as SQLite connections
+            # can't be shared between threads
+            for future in as_completed(futures):
+                group_id = futures[future]
+                try:
+                    total, members = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to export members of group with ID {group_id}: {e}")
+                    outcomes[group_id] = FAILED
+                    continue
+                if members is None:
+                    store.touch(group_id, total)
+                    outcomes[group_id] = UNCHANGED
+                else:
+                    store.replace_members(group_id, members, total)
+                    outcomes[group_id] = FETCHED
+        return outcomes
@@ -1,17 +1,138 @@
-from typing import Callable
+from typing import Callable, Mapping
+from types import MappingProxyType
 from functools import wraps
 import requests
 from requests import Response
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from api.rate_limit import RateLimiter, should_retry
+from api.request_cache import request_cache
+from api.response import ApiResponse
+from api import metrics, serialization
 import constants
 
-import json
+import atexit
 import logging
 import logging.config
+import logging.handlers
+import os
+import queue
+import threading
+import time
 
+# Maximum number of keep-alive connections held open per Atlassian site.
+# Can be overridden by defining POOL_SIZE in constants.py
+POOL_SIZE = getattr(constants, "POOL_SIZE", 10)
 
-def pretty_json(my_json):
-    return json.dumps(my_json, indent=4)
+# Request and response bodies longer than this many bytes are truncated
+# before being logged. Can be overridden by defining MAX_LOG_BODY in constants.py
+MAX_LOG_BODY = getattr(constants, "MAX_LOG_BODY", 4096)
+
+logger = logging.getLogger(__name__)
+
+
+def jira_url() -> str:
+    """
+    The base url of the Jira site. Setting the JIRA_BASE_URL environment variable
+    (e.g. to a local fake_server) overrides the site in constants.py
+    """
+    return os.environ.get("JIRA_BASE_URL") or f"https://{constants.JIRA_INFOTECH_SCU_EDU_AU}"
+
+
+def confluence_url() -> str:
+    """
+    The base url of the Confluence site. Setting the CONFLUENCE_BASE_URL environment
+    variable overrides the site in constants.py
+    """
+    return os.environ.get("CONFLUENCE_BASE_URL") or f"https://{constants.CONFLUENCE_INFOTECH_SCU_EDU_AU}"
+
+
+_logging_lock = threading.Lock()
+_log_listener: logging.handlers.QueueListener | None = None
+
+
+def configure_logging(config_file: str = os.path.join(constants.ROOT_DIR, "logging.conf")):
+    """
+    Loads logging.conf once for the lifetime of the program. File handlers are
+    moved behind a _DeferredQueueHandler, so that formatting records and writing
+    them to disk both happen on a background thread and never block an API call.
+    Handlers left on the root logger, like the console, still format on the
+    calling thread. Calling this again is a no-op
+    """
+    global _log_listener
+    # Checked without the lock first, as every API call comes through here
+    if _log_listener is not None:
+        return
+    with _logging_lock:
+        if _log_listener is not None:
+            return
+        logging.config.fileConfig(config_file, disable_existing_loggers=False)
+
+        root = logging.getLogger()
+        file_handlers = [h for h in root.handlers if isinstance(h, logging.FileHandler)]
+        for handler in file_handlers:
+            root.removeHandler(handler)
+
+        log_queue = queue.SimpleQueue()
+        root.addHandler(_DeferredQueueHandler(log_queue))
+        _log_listener = logging.handlers.QueueListener(
+            log_queue, *file_handlers, respect_handler_level=True
+        )
+        _log_listener.start()
+        atexit.register(_log_listener.stop)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    A QueueHandler that leaves formatting to the handlers behind the listener.
+    QueueHandler.prepare() merges the message with its arguments on the calling
+    thread, which would format every _LazyBody on the request path. Records only
+    ever cross threads within this process, so they are queued as they are
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def truncate(body: bytes, limit: int = MAX_LOG_BODY) -> str:
+    if len(body) <= limit:
+        return body.decode(errors="replace")
+    return f"{body[:limit].decode(errors='replace')}... [{len(body) - limit} more bytes truncated]"
+
+
+def encode_payload(payload) -> bytes | None:
+    """
+    Encodes a payload once, as the bytes that are both sent and logged. Dicts and
+    lists are serialized as compact JSON, str is encoded as UTF-8 and bytes are
+    left as they are
+    """
+    if payload is None or isinstance(payload, bytes):
+        return payload
+    if isinstance(payload, str):
+        return payload.encode()
+    return serialization.dumps(payload)
+
+
+class _LazyBody:
+    """
+    Defers formatting of a request payload or response body until a log
+    handler actually emits the record, which for file handlers happens on the
+    logging thread. Bodies are logged as the compact bytes that went over the
+    wire, truncated to MAX_LOG_BODY bytes, and are never decoded and encoded
+    again just to be logged. A response must have been read already, see
+    log_api_call
+    """
+
+    __slots__ = ("body",)
+
+    def __init__(self, body):
+        self.body = body
+
+    def __str__(self) -> str:
+        body = self.body
+        if isinstance(body, Response):
+            body = body.content or b"{}"
+        return truncate(encode_payload(body))
 
 
 def log_api_call(func: Callable[..., Response]):
@@ -19,51 +140,60 @@ def log_api_call(func: Callable[..., Response]):
     A decorator function that wraps api call functions and performs the following logs:
     INFO: API Call execution progress
     DEBUG: Request metadata and payload and response json
+    ERROR: Response json for any response with an error status code
 
     Takes in a callable function that returns a http Response object to be passed into
     the wrapper function
+
+    Request and response bodies are only formatted when a handler emits them, on
+    the logging thread for file handlers, so the decorator costs next to nothing
+    on the calling thread unless DEBUG goes to the console
     """
+    method = func.__name__.upper()
 
     @wraps(func)
     def wrapper(self, endpoint="", desc="") -> Response:
-        url, payload_str = self.url, ""
-        if self.queries:
-            # ?q1=v1&q2=v2&...
-            url += f"?{'&'.join([f'{k}={v}' for k, v in self.queries.items()])}"
-
-        if self.payload:
-            payload_str = f"\nwith payload {pretty_json(self.payload)}\n"
-
-        # Initialise/get logger
-        logging.config.fileConfig('logging.conf')
-        logger = logging.getLogger(__name__)
+        configure_logging()
 
         # Log progress to info, and JSON details to debug, where they are stored in a file
         logger.info(desc if desc else "Performing API call...")
-        logger.debug(f"Sending {func.__name__.upper()} request to {url + payload_str}")
+        if logger.isEnabledFor(logging.DEBUG):
+            if self.payload:
+                logger.debug("Sending %s request to %s%s%s\nwith payload %s\n", method, self.url,
+                             endpoint, _query_string(self.queries), _LazyBody(self.payload))
+            else:
+                logger.debug("Sending %s request to %s%s%s", method, self.url, endpoint,
+                             _query_string(self.queries))
 
         # Carry out the API call and get the response
         response = func(self, endpoint, desc)
-        response_json = json.dumps(response.json() if response.json()
-                                   else {}, indent=4)
-        response_status = response.status_code
 
-        log_str = f"""
-        Results for {func.__name__.upper()} request to {url} :
-        Response Status: {response.status_code}"
+        # Log the JSON response in error if error status code is given, otherwise in debug
+        level = logging.ERROR if response.status_code >= 400 else logging.DEBUG
+        if logger.isEnabledFor(level):
+            body = response
+            if isinstance(response, ApiResponse) and response.is_streamed:
+                # Settled here, as by the time the logging thread formats the record
+                # the caller may be reading the stream. Successful streamed bodies
+                # are left for the caller, and error bodies are small enough to read
+                body = b"<streamed body, not logged>" if response.ok else response.content
+            logger.log(level, """
+        Results for %s request to %s%s%s :
+        Response Status: %s
         Response JSON:
-        {response_json}\n"""
-
-        if response_status >= 400:
-            # Log the JSON response in error if error status code is given
-            logger.error(log_str)
-        else:
-            # Log the JSON response in debug
-            logger.debug(log_str)
+        %s\n""", method, self.url, endpoint, _query_string(self.queries),
+                       response.status_code, _LazyBody(body))
         return response
     return wrapper
 
 
+def _query_string(queries: dict) -> str:
+    # ?q1=v1&q2=v2&...
+    if not queries:
+        return ""
+    return f"?{'&'.join([f'{k}={v}' for k, v in queries.items()])}"
+
+
 class Http:
     """
     Simple HTTP client to handle API calls
@@ -72,69 +202,252 @@ class Http:
         endpoint - The url path appended to the base url
         desc - The description used for logging  purposes, usually
             for API call execution progress to be logged to INFO
+
+    Every client for the same base url shares one pooled requests.Session,
+    so consecutive calls reuse warm keep-alive connections instead of
+    performing a new TCP and TLS handshake each time. Sessions live until
+    close() is called on a client for that site, or until the interpreter exits
+
+    Clients are immutable. set_payload() and add_queries() return a new client
+    describing one request, so a single shared client (such as the module level
+    `http` in groups.py) can be used from many threads at once without locks
+
+    Every call returns an ApiResponse, which only decodes its body when json() is
+    first called. streaming() returns a client whose responses are not read until
+    the caller asks, so large lists can be scanned with ApiResponse.iter_items()
+
+    GETs go through the shared RequestCache: identical GETs in flight at once share
+    one request, some endpoints are cached for a short while, and every POST, PUT
+    and DELETE drops the cached GETs of its resource. Streamed GETs and those of a
+    client returned by uncached() always send their own request
     """
 
     auth = HTTPBasicAuth(constants.USER_NAME, constants.PASSWORD)
 
-    def __init__(self, url: str, queries: dict = {}, payload={}, headers=None):
-        self.url = url
-        self.queries = queries
-        self.payload = payload
-        self.headers = headers or {
-            "Accept": "application/json",
-            "Content-Type": "application/json",
-        }
+    DEFAULT_HEADERS = MappingProxyType({
+        "Accept": "application/json",
+        "Content-Type": "application/json",
+    })
+
+    _sessions: dict[str, requests.Session] = {}
+    # The size of the connection pool mounted on each session
+    _pool_sizes: dict[str, int] = {}
+    _sessions_lock = threading.Lock()
+
+    __slots__ = ("url", "queries", "payload", "headers", "pool_size", "limiter", "stream", "cached")
+
+    def __init__(self, url: str, queries: Mapping | None = None, payload=None,
+                 headers: Mapping | None = None, pool_size: int = POOL_SIZE,
+                 stream: bool = False, cached: bool = True):
+        _set = super().__setattr__
+        _set("url", url)
+        _set("queries", MappingProxyType(dict(queries or {})))
+        _set("payload", encode_payload(payload))
+        _set("headers", MappingProxyType(dict(headers)) if headers else Http.DEFAULT_HEADERS)
+        _set("pool_size", pool_size)
+        _set("limiter", RateLimiter.for_site(url))
+        _set("stream", stream)
+        _set("cached", cached)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Http clients are immutable, use set_payload() or add_queries() "
+                             f"to build a new client with a different {name}")
+
+    def _replace(self, **changes) -> "Http":
+        """
+        Returns a copy of this client with some fields replaced. The copy shares
+        this client's pooled session and rate limiter
+        """
+        client = object.__new__(Http)
+        for name in Http.__slots__:
+            object.__setattr__(client, name, changes.get(name, getattr(self, name)))
+        return client
+
+    @property
+    def session(self) -> requests.Session:
+        return Http.session_for(self.url, self.pool_size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     @staticmethod
-    def confluence():
-        return Http(f"https://{constants.CONFLUENCE_INFOTECH_SCU_EDU_AU}")
+    def confluence(pool_size: int = POOL_SIZE):
+        return Http(confluence_url(), pool_size=pool_size)
 
     @staticmethod
-    def jira():
-        return Http(f"https://{constants.JIRA_INFOTECH_SCU_EDU_AU}")
+    def jira(pool_size: int = POOL_SIZE):
+        return Http(jira_url(), pool_size=pool_size)
 
-    def set_payload(self, payload):
-        self.payload = payload
-        return self
+    @classmethod
+    def session_for(cls, url: str, pool_size: int = POOL_SIZE) -> requests.Session:
+        """
+        Returns the shared session for a base url, creating it on first use.
+        A client asking for a larger pool_size than the session has, e.g. an
+        AsyncHttp with a higher concurrency, grows the pool to that size
+        """
+        with cls._sessions_lock:
+            session = cls._sessions.get(url)
+            if session is None:
+                session = requests.Session()
+                session.auth = cls.auth
+                cls._sessions[url] = session
+            if pool_size > cls._pool_sizes.get(url, 0):
+                # Block rather than open throwaway connections once the pool is
+                # exhausted, so concurrent callers queue for a warm connection.
+                # Requests using a connection of a replaced pool finish on it, and
+                # its connections are closed once they are done with
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                                      pool_block=True)
+                session.mount(url, adapter)
+                cls._pool_sizes[url] = pool_size
+            return session
 
-    def add_queries(self, new_queries: dict[str, str]):
-        self.queries = {**self.queries, **new_queries}
-        return self
+    def close(self):
+        """
+        Closes the pooled connections for this client's base url. Any client
+        for the same url created afterwards will open a fresh pool
+        """
+        with Http._sessions_lock:
+            session = Http._sessions.pop(self.url, None)
+            Http._pool_sizes.pop(self.url, None)
+        if session is not None:
+            session.close()
+
+    @classmethod
+    def close_all(cls):
+        """
+        Closes the pooled connections for every site
+        """
+        with cls._sessions_lock:
+            sessions = list(cls._sessions.values())
+            cls._sessions.clear()
+            cls._pool_sizes.clear()
+        for session in sessions:
+            session.close()
+
+    def throttle_state(self) -> dict:
+        """
+        Returns the current rate limit state of this client's site, see RateLimiter.state()
+        """
+        return self.limiter.state()
+
+    def set_payload(self, payload) -> "Http":
+        """
+        Returns a new client that sends payload with its requests. This client is
+        left unchanged. The payload is serialized here, once, see encode_payload()
+        """
+        return self._replace(payload=encode_payload(payload))
+
+    def add_queries(self, new_queries: Mapping[str, str]) -> "Http":
+        """
+        Returns a new client with new_queries added to this client's queries. This
+        client is left unchanged
+        """
+        return self._replace(queries=MappingProxyType({**self.queries, **new_queries}))
+
+    def streaming(self) -> "Http":
+        """
+        Returns a new client whose response bodies are left unread until the caller
+        consumes them, e.g. with ApiResponse.iter_items(). Each streamed response
+        holds a pooled connection until it is fully read or closed
+        """
+        return self._replace(stream=True)
+
+    def uncached(self) -> "Http":
+        """
+        Returns a new client whose GETs always send their own request and are
+        never cached, e.g. to read back a change made by someone else
+        """
+        return self._replace(cached=False)
+
+    def _request(self, method: str, endpoint: str, data=None) -> ApiResponse:
+        """
+        Sends a request through the pooled session for this client's base url,
+        paced by the site's RateLimiter. Throttled (429) responses, and unavailable
+        (503) responses to GET, PUT and DELETE, are retried after backing off, up to
+        MAX_RETRIES times. A POST is never retried after a 503, as it may have been
+        carried out anyway.
+        Anything but a GET drops the cached GETs of the resource it changes
+        """
+        if not endpoint.startswith("/"):
+            endpoint = f"/{endpoint}"
+        if method == "GET":
+            return self._send_with_retries(method, endpoint, data)
+        try:
+            return self._send_with_retries(method, endpoint, data)
+        finally:
+            request_cache.invalidate(self.url, endpoint)
+
+    def _send_with_retries(self, method: str, endpoint: str, data) -> ApiResponse:
+        template = metrics.endpoint_template(endpoint)
+        for attempt in range(self.limiter.max_retries + 1):
+            self.limiter.acquire()
+            response = self._send(method, endpoint, template, data)
+            self.limiter.update(response)
+            if not should_retry(method, response.status_code) or attempt == self.limiter.max_retries:
+                return response
+            # Release the connection of a streamed response before waiting
+            response.close()
+            delay = self.limiter.backoff(attempt, response)
+            metrics.retries.inc(method, template, response.status_code)
+            metrics.throttle_waits.inc(method, template, amount=delay)
+            logger.warning("%s %s%s returned %s, retrying in %.1fs (attempt %s of %s)",
+                           method, self.url, endpoint, response.status_code, delay,
+                           attempt + 1, self.limiter.max_retries)
+            time.sleep(delay)
+
+    def _send(self, method: str, endpoint: str, template: str, data) -> ApiResponse:
+        """
+        Sends one attempt of a request and records its metrics
+        """
+        if data:
+            metrics.bytes_out.inc(method, template, amount=len(data))
+        metrics.in_flight.inc(method, template)
+        start = time.perf_counter()
+        try:
+            response = self.session.request(
+                method,
+                url=self.url + endpoint,
+                params=dict(self.queries),
+                headers=self.headers,
+                data=data,
+                stream=self.stream,
+            )
+        except Exception as e:
+            metrics.request_errors.inc(method, template, type(e).__name__)
+            raise
+        finally:
+            metrics.in_flight.dec(method, template)
+            metrics.request_duration.observe(time.perf_counter() - start, method, template)
+        metrics.responses.inc(method, template, response.status_code)
+        response = ApiResponse.wrap(response)
+        # Count a streamed body by its declared length rather than reading it here
+        size = (int(response.headers.get("Content-Length", 0)) if response.is_streamed
+                else len(response.content))
+        metrics.bytes_in.inc(method, template, amount=size)
+        return response
 
     @log_api_call
-    def get(self, endpoint: str, desc: str = "") -> Response:
-        return requests.get(
-            url=self.url + f"/{endpoint}",
-            params=self.queries,
-            headers=self.headers,
-            auth=self.auth,
-        )
+    def get(self, endpoint: str, desc: str = "") -> ApiResponse:
+        if self.stream or not self.cached:
+            return self._request("GET", endpoint)
+        return request_cache.get(self.url, endpoint, self.queries,
+                                 lambda: self._request("GET", endpoint))
 
     @log_api_call
-    def post(self, endpoint: str, desc: str = "") -> Response:
-        return requests.post(
-            url=self.url + f"{endpoint}",
-            params=self.queries,
-            headers=self.headers,
-            auth=self.auth,
-            data=self.payload
-        )
+    def post(self, endpoint: str, desc: str = "") -> ApiResponse:
+        return self._request("POST", endpoint, self.payload)
 
     @log_api_call
-    def put(self, endpoint: str, desc: str = "") -> Response:
-        return requests.put(
-            url=self.url + f"{endpoint}",
-            params=self.queries,
-            headers=self.headers,
-            auth=self.auth,
-            data=self.payload
-        )
+    def put(self, endpoint: str, desc: str = "") -> ApiResponse:
+        return self._request("PUT", endpoint, self.payload)
 
     @log_api_call
-    def delete(self, endpoint: str, desc: str = "") -> Response:
-        return requests.delete(
-            url=self.url + f"{endpoint}",
-            params=self.queries,
-            headers=self.headers,
-            auth=self.auth,
-        )
+    def delete(self, endpoint: str, desc: str = "") -> ApiResponse:
+        return self._request("DELETE", endpoint)
+
+
+atexit.register(Http.close_all)
@@ -0,0 +1,182 @@
+from api.bulk import BULK_WORKERS, BulkReport, BulkResult, run_bulk
+from api.http import Http
+
+from requests import Response
+from typing import Callable, Iterable
+import json
+import logging
+import os
+import threading
+import time
+
+# Completed operations are fsynced to disk in batches of this many records, or
+# after this many seconds, whichever comes first
+FSYNC_EVERY = 200
+FSYNC_INTERVAL = 1.0
+
+PLANNED = "planned"
+DONE = "done"
+FAILED = "failed"
+
+logger = logging.getLogger(__name__)
+
+http = Http.jira()
+
+
+class Journal:
+    """
+    An append-only, on-disk record of the operations in a long bulk run, so that a
+    run that dies part way can be resumed from where it stopped.
+
+    Each operation is identified by a key that must be the same on every run, e.g.
+    f"create_group:{name}". Every line of the journal file is one JSON record:
+        {"key": "create_group:COMP1001", "state": "planned"}
+        {"key": "create_group:COMP1001", "state": "done", "status": 201}
+
+    plan() records the operations about to be sent and fsyncs once. Completion
+    records are written as operations finish and fsynced in batches. Opening an
+    existing journal resumes it: run() skips operations already recorded as done.
+    Operations that were planned but never recorded as done may or may not have
+    reached Jira before the crash. They are re-checked with the check function
+    given to run(), if any, before being sent again, so non-idempotent calls like
+    Groups.create_group are not repeated
+    """
+
+    def __init__(self, path: str, fsync_every: int = FSYNC_EVERY,
+                 fsync_interval: float = FSYNC_INTERVAL):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.states: dict[str, str] = {}
+        # Operations left unfinished by a previous run, which may need re-checking
+        self.resumed: set[str] = set()
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+        if os.path.exists(path):
+            self._replay()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _replay(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-write
+                    continue
+                if self.states.get(record["key"]) != DONE:
+                    self.states[record["key"]] = record["state"]
+        self.resumed = set(self.unfinished())
+        logger.info(f"Resuming journal {self.path}: {len(self.done())} operations done, "
+                    f"{len(self.unfinished())} to re-check")
+
+    def done(self) -> list[str]:
+        return [key for key, state in self.states.items() if state == DONE]
+
+    def unfinished(self) -> list[str]:
+        """
+        The keys of operations that were planned or failed but never completed
+        """
+        return [key for key, state in self.states.items() if state != DONE]
+
+    def _write(self, records: list[dict], sync: bool = False):
+        with self._lock:
+            self._file.write("".join(json.dumps(record) + "\n" for record in records))
+            self._unsynced += len(records)
+            if (sync or self._unsynced >= self.fsync_every
+                    or time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync()
+            for record in records:
+                if self.states.get(record["key"]) != DONE:
+                    self.states[record["key"]] = record["state"]
+
+    def _sync(self):
+        # Must be called with self._lock held
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def plan(self, keys: Iterable[str]):
+        """
+        Records operations as planned with a single fsync, skipping any already
+        in the journal
+        """
+        self._write([{"key": key, "state": PLANNED} for key in keys if key not in self.states],
+                    sync=True)
+
+    def run(self, key: str, func: Callable[..., Response], *args,
+            check: Callable[..., bool] | None = None) -> Response | None:
+        """
+        Calls func(*args) unless the journal already records key as done, and
+        records the outcome. Returns None when the call was skipped.
+
+        check(*args) is called first for operations left planned or failed by a
+        previous run; returning True marks the operation as done without
+        sending it again. An operation that was not planned beforehand is planned on
+        its own, which costs an fsync; plan() whole batches up front to avoid that
+        """
+        state = self.states.get(key)
+        if state == DONE:
+            return None
+        if state is None:
+            self.plan([key])
+        elif key in self.resumed and check is not None and check(*args):
+            logger.info(f"{key} was already applied before the last run stopped")
+            self._write([{"key": key, "state": DONE, "status": None}])
+            return None
+
+        response = func(*args)
+        self._write([{"key": key, "state": DONE if response.ok else FAILED,
+                      "status": response.status_code}])
+        return response
+
+    def run_bulk(self, func: Callable[..., Response], items: Iterable[tuple],
+                 key: Callable[..., str], check: Callable[..., bool] | None = None,
+                 max_workers: int = BULK_WORKERS,
+                 on_result: Callable[[BulkResult], None] | None = None) -> BulkReport:
+        """
+        Journals a bulk operation: plans every item with one fsync, then runs the
+        unfinished ones on a thread pool. key(*item) gives each item's journal key.
+        Items skipped because they were already done are marked skipped.
+        The same as bulk.run_bulk(..., journal=self, key=key, check=check)
+        """
+        return run_bulk(func, items, max_workers, on_result, journal=self, key=key, check=check)
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._sync()
+                self._file.close()
+
+
+def group_exists(name: str) -> bool:
+    """
+    A check for Journal.run(Groups.create_group, ...)
+    https://developer.atlassian.com/cloud/jira/platform/rest/v3/api-group-groups/#api-rest-api-3-group-get
+    """
+    return http.add_queries({
+        "groupname": name
+    }).get(
+        "/rest/api/3/group",
+        f"Checking whether group {name} exists in Jira."
+    ).ok
+
+
+def project_exists(name: str, key: str) -> bool:
+    """
+    A check for Journal.run(Projects.create_scrum_project, ...)
+    https://developer.atlassian.com/cloud/jira/platform/rest/v3/api-group-projects/#api-rest-api-3-project-projectidorkey-get
+    """
+    return http.get(
+        f"/rest/api/3/project/{key}",
+        f"Checking whether project {key} exists in Jira."
+    ).ok
@@ -0,0 +1,137 @@
+from typing import Iterable
+import sqlite3
+import time
+
+# Outcomes of syncing one group, see Groups.export_membership()
+FETCHED = "fetched"
+UNCHANGED = "unchanged"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS groups (
+    group_id TEXT PRIMARY KEY,
+    member_count INTEGER NOT NULL,
+    synced_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS members (
+    group_id TEXT NOT NULL,
+    account_id TEXT NOT NULL,
+    display_name TEXT,
+    PRIMARY KEY (group_id, account_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS members_by_account ON members (account_id, group_id);
+"""
+
+
+class MembershipStore:
+    """
+    A local SQLite snapshot of the members of selected Jira groups, filled by
+    Groups.export_membership(). Members are indexed by group ID (the primary key)
+    and by account ID, so audits such as "which students are missing from which
+    course group" are answered locally instead of with paged API calls.
+
+    A store must only be used from the thread that opened it
+    """
+
+    def __init__(self, path: str):
+        """
+        :param str path: The database file, created if it does not exist, or
+            ":memory:" for a store that lasts as long as the object
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def member_count(self, group_id: str) -> int | None:
+        """
+        The member count recorded at the group's last sync, or None if it has
+        never been synced
+        """
+        row = self.connection.execute(
+            "SELECT member_count FROM groups WHERE group_id = ?", (group_id,)).fetchone()
+        return row[0] if row else None
+
+    def synced_at(self, group_id: str) -> float | None:
+        row = self.connection.execute(
+            "SELECT synced_at FROM groups WHERE group_id = ?", (group_id,)).fetchone()
+        return row[0] if row else None
+
+    def replace_members(self, group_id: str, members: Iterable[dict], member_count: int | None = None):
+        """
+        Replaces the stored members of a group with members, the user dicts
+        returned by the group member endpoint, in one transaction. member_count is
+        the total Jira reported for the group, recorded for the next sync to compare
+        against. It can differ from the members stored, e.g. if the group changed
+        while it was being paged through, so it defaults to their number only when
+        not given
+        """
+        rows = [(group_id, member["accountId"], member.get("displayName")) for member in members]
+        with self.connection:
+            self.connection.execute("DELETE FROM members WHERE group_id = ?", (group_id,))
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO members (group_id, account_id, display_name) VALUES (?, ?, ?)", rows)
+            self.touch(group_id, len(rows) if member_count is None else member_count)
+
+    def touch(self, group_id: str, member_count: int):
+        """
+        Records that a group was found unchanged with member_count members
+        """
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO groups (group_id, member_count, synced_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (group_id) DO UPDATE SET member_count = excluded.member_count, "
+                "synced_at = excluded.synced_at",
+                (group_id, member_count, time.time()))
+
+    def forget(self, group_id: str):
+        with self.connection:
+            self.connection.execute("DELETE FROM members WHERE group_id = ?", (group_id,))
+            self.connection.execute("DELETE FROM groups WHERE group_id = ?", (group_id,))
+
+    def group_ids(self) -> list[str]:
+        return [row[0] for row in self.connection.execute("SELECT group_id FROM groups ORDER BY group_id")]
+
+    def members(self, group_id: str) -> set[str]:
+        return {row[0] for row in self.connection.execute(
+            "SELECT account_id FROM members WHERE group_id = ?", (group_id,))}
+
+    def groups_of(self, account_id: str) -> set[str]:
+        return {row[0] for row in self.connection.execute(
+            "SELECT group_id FROM members WHERE account_id = ?", (account_id,))}
+
+    def diff(self, group_id: str, account_ids: Iterable[str]) -> tuple[set[str], set[str]]:
+        """
+        Compares the stored members of a group with the account IDs that should be
+        in it. Returns the account IDs missing from the group and the members that
+        should not be in it
+        """
+        expected = set(account_ids)
+        actual = self.members(group_id)
+        return expected - actual, actual - expected
+
+    def missing_members(self, expected: Iterable[tuple[str, str]]) -> list[tuple[str, str]]:
+        """
+        Returns the (groupId, accountId) pairs of expected, e.g. a whole roster,
+        that are not members according to the store. The pairs are joined against
+        the store in SQLite, so large rosters are checked in one pass
+        """
+        with self.connection:
+            self.connection.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS expected (group_id TEXT, account_id TEXT)")
+            self.connection.execute("DELETE FROM expected")
+            self.connection.executemany("INSERT INTO expected VALUES (?, ?)", expected)
+            rows = self.connection.execute(
+                "SELECT DISTINCT e.group_id, e.account_id FROM expected e "
+                "LEFT JOIN members m ON m.group_id = e.group_id AND m.account_id = e.account_id "
+                "WHERE m.account_id IS NULL ORDER BY e.group_id, e.account_id").fetchall()
+            self.connection.execute("DELETE FROM expected")
+        return rows
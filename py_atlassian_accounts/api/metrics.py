@@ -0,0 +1,186 @@
+import json
+import threading
+
+# Path segments kept as they are when building endpoint templates. Any other
+# segment is an ID or key and is replaced with {id}, so that e.g.
+# /rest/api/3/project/PROJ/role/10002 is recorded as /rest/api/3/project/{id}/role/{id}
+TEMPLATE_SEGMENTS = {
+    "rest", "api", "2", "3", "group", "groups", "user", "users", "member", "bulk", "search",
+    "project", "role", "permissionscheme", "space", "longtask", "task", "delete",
+}
+
+# Upper bounds, in seconds, of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def endpoint_template(endpoint: str) -> str:
+    """
+    Replaces the IDs and keys in an endpoint path with {id}
+    """
+    path = endpoint.split("?", 1)[0]
+    return "/".join(
+        segment if not segment or segment in TEMPLATE_SEGMENTS else "{id}"
+        for segment in path.split("/")
+    )
+
+
+def _labels_text(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+class Counter:
+    """
+    A monotonically increasing count per combination of label values
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values: dict[tuple, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, labels, value) for labels, value in self.values.items()]
+
+    def snapshot(self) -> list[dict]:
+        return [{"labels": dict(zip(self.labels, labels)), "value": value}
+                for _, labels, value in self.samples()]
+
+
+class Gauge(Counter):
+    """
+    A value that can go up and down, e.g. the number of requests in flight
+    """
+
+    kind = "gauge"
+
+    def dec(self, *label_values, amount: float = 1):
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram:
+    """
+    Counts observations into cumulative buckets per combination of label values,
+    along with their sum and count
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [count per bucket..., +Inf count, sum]
+        self.values: dict[tuple, list[float]] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self.lock:
+            counts = self.values.get(label_values)
+            if counts is None:
+                counts = self.values[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for labels, counts in self.values.items():
+                for bound, count in zip(self.buckets, counts):
+                    samples.append((f"{self.name}_bucket", labels + (bound,), count))
+                samples.append((f"{self.name}_bucket", labels + ("+Inf",), counts[-2]))
+                samples.append((f"{self.name}_sum", labels, counts[-1]))
+                samples.append((f"{self.name}_count", labels, counts[-2]))
+        return samples
+
+    def label_names(self, sample_name: str) -> tuple[str, ...]:
+        return self.labels + ("le",) if sample_name.endswith("_bucket") else self.labels
+
+    def snapshot(self) -> list[dict]:
+        with self.lock:
+            return [{
+                "labels": dict(zip(self.labels, labels)),
+                "buckets": dict(zip([str(bound) for bound in self.buckets] + ["+Inf"], counts[:-1])),
+                "count": counts[-2],
+                "sum": counts[-1],
+            } for labels, counts in self.values.items()]
+
+
+class MetricsRegistry:
+    """
+    The collection of metrics recorded by the request path, exportable in the
+    Prometheus text exposition format or as a JSON snapshot
+    """
+
+    def __init__(self):
+        self.metrics: dict[str, Counter | Gauge | Histogram] = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def prometheus_text(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                names = metric.label_names(name) if isinstance(metric, Histogram) else metric.labels
+                lines.append(f"{name}{_labels_text(names, labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        return {name: {"type": metric.kind, "description": metric.description,
+                       "values": metric.snapshot()}
+                for name, metric in self.metrics.items()}
+
+    def snapshot_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=4)
+
+    def reset(self):
+        for metric in self.metrics.values():
+            with metric.lock:
+                metric.values.clear()
+
+
+registry = MetricsRegistry()
+
+LABELS = ("method", "endpoint")
+
+request_duration = registry.register(Histogram(
+    "atlassian_request_duration_seconds", "Time taken by each HTTP request attempt", LABELS))
+responses = registry.register(Counter(
+    "atlassian_responses_total", "Responses received, by status code", LABELS + ("status",)))
+request_errors = registry.register(Counter(
+    "atlassian_request_errors_total", "Requests that raised before a response was received",
+    LABELS + ("error",)))
+retries = registry.register(Counter(
+    "atlassian_retries_total", "Requests retried after a throttled or unavailable response",
+    LABELS + ("status",)))
+throttle_waits = registry.register(Counter(
+    "atlassian_throttle_wait_seconds_total", "Seconds spent backing off before retries", LABELS))
+bytes_out = registry.register(Counter(
+    "atlassian_request_bytes_total", "Request body bytes sent", LABELS))
+bytes_in = registry.register(Counter(
+    "atlassian_response_bytes_total", "Response body bytes received", LABELS))
+in_flight = registry.register(Gauge(
+    "atlassian_requests_in_flight", "Requests currently waiting for a response", LABELS))
+cache_hits = registry.register(Counter(
+    "atlassian_cache_hits_total", "GETs answered without a request of their own, from the "
+    "cache or from an identical GET in flight", LABELS + ("source",)))
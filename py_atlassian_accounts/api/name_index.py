@@ -0,0 +1,159 @@
+from api.http import Http
+from api.pagination import iter_jira
+import constants
+
+from typing import Callable, Iterable
+import json
+import logging
+import os
+import threading
+import time
+
+# How long, in seconds, a loaded index is trusted before it is swept again.
+# Can be overridden by defining NAME_INDEX_TTL in constants.py
+NAME_INDEX_TTL = getattr(constants, "NAME_INDEX_TTL", 3600)
+
+logger = logging.getLogger(__name__)
+
+http = Http.jira()
+
+
+class NameIndex:
+    """
+    An in-memory map from the names of one type of Jira entity to their IDs
+
+    The whole index is loaded in one sweep of the list endpoint the first time a
+    name is looked up, and again once it is older than ttl seconds or after
+    invalidate() is called. The library keeps it up to date as it creates and
+    deletes entities, so a run never looks the same name up twice.
+
+    If path is set, the index is saved there as JSON after each sweep and loaded
+    from it at start up if it is still within its ttl
+    """
+
+    def __init__(self, kind: str, loader: Callable[[], Iterable[tuple[str, str]]],
+                 ttl: float = NAME_INDEX_TTL, path: str | None = None,
+                 case_sensitive: bool = True):
+        """
+        :param str kind: The entity type, used for logging and error messages
+        :param loader: A function returning every (name, id) pair of that type
+        """
+        self.kind = kind
+        self.loader = loader
+        self.ttl = ttl
+        self.path = path
+        self.case_sensitive = case_sensitive
+        self.ids: dict[str, str] = {}
+        self.loaded_at: float | None = None
+        self.lock = threading.RLock()
+
+    def _key(self, name: str) -> str:
+        return name if self.case_sensitive else name.casefold()
+
+    def _fresh(self) -> bool:
+        return self.loaded_at is not None and time.time() - self.loaded_at < self.ttl
+
+    def _ensure_loaded(self):
+        with self.lock:
+            if self._fresh():
+                return
+            if self.path and self._load_file() and self._fresh():
+                return
+            logger.info(f"Loading {self.kind} name index...")
+            self.ids = {self._key(name): str(entity_id) for name, entity_id in self.loader()}
+            self.loaded_at = time.time()
+            self._save_file()
+
+    def _load_file(self) -> bool:
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return False
+        self.ids, self.loaded_at = stored["ids"], stored["loaded_at"]
+        return True
+
+    def _save_file(self):
+        if not self.path:
+            return
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"loaded_at": self.loaded_at, "ids": self.ids}, f)
+        os.replace(temp_path, self.path)
+
+    def get(self, name: str, default: str | None = None) -> str | None:
+        self._ensure_loaded()
+        with self.lock:
+            return self.ids.get(self._key(name), default)
+
+    def __getitem__(self, name: str) -> str:
+        entity_id = self.get(name)
+        if entity_id is None:
+            raise KeyError(f"No {self.kind} named {name!r}")
+        return entity_id
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def add(self, name: str, entity_id: str):
+        """
+        Records a newly created entity. Has no effect until the index is loaded,
+        as the next sweep will pick the entity up
+        """
+        with self.lock:
+            if self.loaded_at is not None:
+                self.ids[self._key(name)] = str(entity_id)
+                self._save_file()
+
+    def discard(self, name: str | None = None, entity_id: str | None = None):
+        """
+        Forgets a deleted entity by its name or by its ID
+        """
+        with self.lock:
+            if name is not None:
+                self.ids.pop(self._key(name), None)
+            if entity_id is not None:
+                self.ids = {n: i for n, i in self.ids.items() if i != str(entity_id)}
+            if self.loaded_at is not None:
+                self._save_file()
+
+    def invalidate(self):
+        """
+        Forces the next lookup to sweep the list endpoint again
+        """
+        with self.lock:
+            self.loaded_at = None
+
+
+def _load_groups() -> Iterable[tuple[str, str]]:
+    return ((group["name"], group["groupId"])
+            for group in iter_jira("/rest/api/3/group/bulk", "Listing groups in Jira.",
+                                   prefetch=True, client=http))
+
+
+def _load_roles() -> Iterable[tuple[str, str]]:
+    response = http.streaming().get("/rest/api/3/role", "Listing project roles in Jira.")
+    response.raise_for_status()
+    return ((role["name"], role["id"]) for role in response.iter_items())
+
+
+def _load_permission_schemes() -> Iterable[tuple[str, str]]:
+    response = http.streaming().get("/rest/api/3/permissionscheme", "Listing permission schemes in Jira.")
+    response.raise_for_status()
+    return ((scheme["name"], scheme["id"]) for scheme in response.iter_items("permissionSchemes"))
+
+
+# Jira group names are case-insensitive
+groups = NameIndex("group", _load_groups, case_sensitive=False)
+roles = NameIndex("project role", _load_roles)
+permission_schemes = NameIndex("permission scheme", _load_permission_schemes)
+
+
+def persist_to(directory: str):
+    """
+    Saves all three indexes under directory, reusing any that are still fresh
+    """
+    os.makedirs(directory, exist_ok=True)
+    for index, file_name in ((groups, "groups.json"), (roles, "roles.json"),
+                             (permission_schemes, "permission_schemes.json")):
+        index.path = os.path.join(directory, file_name)
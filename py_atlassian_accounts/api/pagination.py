@@ -0,0 +1,107 @@
+from api.http import Http
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterator
+from urllib.parse import parse_qsl, urlparse
+
+# The page sizes requested by default. Jira caps most list endpoints at 50 and
+# Confluence at 25 per page unless a larger limit is requested
+JIRA_PAGE_SIZE = 50
+CONFLUENCE_PAGE_SIZE = 25
+
+
+def _iter_pages(fetch: Callable[[dict], dict], params: dict,
+                next_params: Callable[[dict, dict], dict | None],
+                prefetch: bool) -> Iterator[dict]:
+    """
+    Yields decoded pages lazily: fetch(params) returns one page and
+    next_params(params, page) returns the params of the page after it, or None
+    after the last page. With prefetch, the next page is requested on a background
+    thread while the caller is still processing the current one
+    """
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch") if prefetch else None
+    try:
+        page = fetch(params)
+        while True:
+            params = next_params(params, page)
+            future: Future | None = None
+            if executor is not None and params is not None:
+                future = executor.submit(fetch, params)
+            yield page
+            if params is None:
+                return
+            page = future.result() if future is not None else fetch(params)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _fetcher(client: Http, endpoint: str, desc: str,
+             queries: dict | None) -> Callable[[dict], dict]:
+    def fetch(params: dict) -> dict:
+        response = client.add_queries({**(queries or {}), **params}).get(endpoint, desc)
+        response.raise_for_status()
+        return response.json()
+    return fetch
+
+
+def iter_jira_pages(endpoint: str, desc: str = "", queries: dict | None = None,
+                    page_size: int = JIRA_PAGE_SIZE, prefetch: bool = False,
+                    client: Http | None = None, start_at: int = 0) -> Iterator[dict]:
+    """
+    Yields each page of a Jira list endpoint that pages with startAt/maxResults
+    and reports isLast (or total), starting from item start_at
+    https://developer.atlassian.com/cloud/jira/platform/rest/v3/intro/#pagination
+    """
+
+    def next_params(params: dict, page: dict) -> dict | None:
+        count = len(page.get("values", []))
+        start_at = params["startAt"] + count
+        if count == 0 or page.get("isLast", False):
+            return None
+        if "total" in page and start_at >= page["total"]:
+            return None
+        return {**params, "startAt": start_at}
+
+    return _iter_pages(_fetcher(client or Http.jira(), endpoint, desc, queries),
+                       {"startAt": start_at, "maxResults": page_size}, next_params, prefetch)
+
+
+def iter_jira(endpoint: str, desc: str = "", queries: dict | None = None,
+              page_size: int = JIRA_PAGE_SIZE, prefetch: bool = False,
+              client: Http | None = None, start_at: int = 0) -> Iterator[dict]:
+    """
+    Yields every item of a paged Jira list endpoint from item start_at, one at a time
+    """
+    for page in iter_jira_pages(endpoint, desc, queries, page_size, prefetch, client, start_at):
+        yield from page.get("values", [])
+
+
+def iter_confluence_pages(endpoint: str, desc: str = "", queries: dict | None = None,
+                          limit: int = CONFLUENCE_PAGE_SIZE, prefetch: bool = False,
+                          client: Http | None = None) -> Iterator[dict]:
+    """
+    Yields each page of a Confluence list endpoint that pages with start/limit and
+    links to the following page in _links.next. The query string of the next link
+    is followed as given, so cursor-based endpoints are paged correctly too
+    https://developer.atlassian.com/cloud/confluence/rest/v1/intro/#using-the-rest-api
+    """
+
+    def next_params(params: dict, page: dict) -> dict | None:
+        next_link = page.get("_links", {}).get("next")
+        if not next_link or not page.get("results"):
+            return None
+        return dict(parse_qsl(urlparse(next_link).query))
+
+    return _iter_pages(_fetcher(client or Http.confluence(), endpoint, desc, queries),
+                       {"start": 0, "limit": limit}, next_params, prefetch)
+
+
+def iter_confluence(endpoint: str, desc: str = "", queries: dict | None = None,
+                    limit: int = CONFLUENCE_PAGE_SIZE, prefetch: bool = False,
+                    client: Http | None = None) -> Iterator[dict]:
+    """
+    Yields every item of a paged Confluence list endpoint, one at a time
+    """
+    for page in iter_confluence_pages(endpoint, desc, queries, limit, prefetch, client):
+        yield from page.get("results", [])
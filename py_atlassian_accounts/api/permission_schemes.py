@@ -1,8 +1,12 @@
 from api.http import Http
+from api import name_index
 
 from requests import Response
+from typing import Iterable
+import hashlib
+import threading
 
-http = Http.confluence()
+http = Http.jira()
 
 STUDENT_PERMISSIONS = [
         # Issue permissions
@@ -66,6 +70,53 @@ TUTOR_PERMISSIONS = [
 ]
 
 
+def fingerprint(grants: Iterable[tuple[str, str, str]]) -> str:
+    """
+    Returns a canonical fingerprint of a set of (holder_type, holder_value, permission)
+    grants. The order of the grants and any duplicates do not affect the result,
+    so two schemes granting the same permissions always share a fingerprint
+    """
+    canonical = "\n".join(sorted({"\t".join(grant) for grant in grants}))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _scheme_grants(scheme: dict) -> Iterable[tuple[str, str, str]]:
+    """
+    Extracts the grants of a permission scheme returned with expand=permissions.
+    Holders report their ID under "value" and, on older sites, only under "parameter"
+    """
+    for grant in scheme.get("permissions", []):
+        holder = grant.get("holder", {})
+        yield holder.get("type", ""), str(holder.get("value", holder.get("parameter", ""))), grant["permission"]
+
+
+def _load_scheme_fingerprints() -> Iterable[tuple[str, str]]:
+    # Every scheme with every grant can be a very large body, so it is streamed
+    # and decoded one scheme at a time
+    response = http.streaming().add_queries({
+        "expand": "permissions"
+    }).get(
+        "/rest/api/3/permissionscheme",
+        "Listing permission schemes with their permissions in Jira."
+    )
+    response.raise_for_status()
+    return ((fingerprint(_scheme_grants(scheme)), scheme["id"])
+            for scheme in response.iter_items("permissionSchemes"))
+
+
+# Maps the fingerprint of every existing scheme's permissions to its scheme ID
+scheme_fingerprints = name_index.NameIndex("permission scheme fingerprint", _load_scheme_fingerprints)
+# One lock per fingerprint, so only get-or-creates of the same permissions wait
+# for each other's POST
+_get_or_create_locks: dict[str, threading.Lock] = {}
+_get_or_create_locks_lock = threading.Lock()
+
+
+def _get_or_create_lock(key: str) -> threading.Lock:
+    with _get_or_create_locks_lock:
+        return _get_or_create_locks.setdefault(key, threading.Lock())
+
+
 class PermissionSchemes:
     """
     An object to create and edit permission schemes to be used in Jira projects
@@ -135,12 +186,12 @@ class PermissionSchemes:
         if (subject_type, subject_id) in self.permissions:
             del self.permissions[(subject_type, subject_id)]
 
-    def create_permission_scheme(self, description: str, scheme_name: str) -> Response:
+    def payload(self, description: str, scheme_name: str) -> dict:
         """
-        scheme_name must be unique from other scheme names in the Jira Cloud
+        Builds the permission scheme JSON body from self.permissions
         https://developer.atlassian.com/cloud/jira/platform/rest/v3/api-group-permission-schemes/#api-rest-api-3-permissionscheme-post
         """
-        payload = {
+        return {
             "description": description,
             "name": scheme_name,
             "permissions": [
@@ -151,22 +202,63 @@ class PermissionSchemes:
                     },
                     "permission": permission
                 }
-                for holder, permissions in self.permissions
-                for holder_type, value in holder
+                for (holder_type, value), permissions in self.permissions.items()
                 for permission in permissions
             ]
         }
-        return http.set_payload(payload).post(
+
+    def create_permission_scheme(self, description: str, scheme_name: str) -> Response:
+        """
+        scheme_name must be unique from other scheme names in the Jira Cloud
+        https://developer.atlassian.com/cloud/jira/platform/rest/v3/api-group-permission-schemes/#api-rest-api-3-permissionscheme-post
+        """
+        response = http.set_payload(self.payload(description, scheme_name)).post(
             "/rest/api/3/permissionscheme",
             f"Creating permission scheme {scheme_name}..."
         )
+        if response.ok:
+            name_index.permission_schemes.add(scheme_name, response.json()["id"])
+            scheme_fingerprints.add(self.fingerprint(), response.json()["id"])
+        return response
+
+    def fingerprint(self) -> str:
+        """
+        Returns the fingerprint of the permissions in this scheme, see fingerprint()
+        """
+        return fingerprint(
+            (holder_type, value, permission)
+            for (holder_type, value), permissions in self.permissions.items()
+            for permission in permissions
+        )
+
+    def get_or_create_permission_scheme(self, description: str, scheme_name: str) -> tuple[str, bool]:
+        """
+        Returns the ID of an existing scheme that grants exactly the same permissions
+        as this one, or creates the scheme if there is none. The second value is
+        True if a new scheme was created. Raises requests.HTTPError if creating fails
+        """
+        key = self.fingerprint()
+        with _get_or_create_lock(key):
+            scheme_id = scheme_fingerprints.get(key)
+            if scheme_id is not None:
+                return scheme_id, False
+            # create_permission_scheme records the new scheme in scheme_fingerprints
+            # before the lock is released, so the next caller with the same
+            # permissions finds it
+            response = self.create_permission_scheme(description, scheme_name)
+            response.raise_for_status()
+            return str(response.json()["id"]), True
 
     @staticmethod
     def remove_permission_scheme(scheme_id: str) -> Response:
         """
         https://developer.atlassian.com/cloud/jira/platform/rest/v3/api-group-permission-schemes/#api-rest-api-3-permissionscheme-schemeid-delete
         """
-        return http.delete(
+        response = http.delete(
             f"/rest/api/3/permissionscheme/{scheme_id}",
             f"Deleting permission scheme with id {scheme_id}"
         )
+        if response.ok:
+            name_index.permission_schemes.discard(entity_id=scheme_id)
+            scheme_fingerprints.discard(entity_id=scheme_id)
+        return response
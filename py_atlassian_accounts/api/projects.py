@@ -1,6 +1,9 @@
-from http.http import Http
+from api.http import Http
+from api import name_index
+from api.pagination import iter_jira
 
 from requests import Response
+from typing import Iterator
 
 http = Http.jira()
 
@@ -28,6 +31,15 @@ class Projects:
             f"Creating scrum project {name}..."
         )
 
+    @staticmethod
+    def iter_projects(prefetch: bool = False) -> Iterator[dict]:
+        """
+        Lazily yields every project visible to the user, one page at a time
+        https://developer.atlassian.com/cloud/jira/platform/rest/v3/api-group-projects/#api-rest-api-3-project-search-get
+        """
+        return iter_jira("/rest/api/3/project/search", "Listing projects...",
+                         prefetch=prefetch, client=http)
+
     @staticmethod
     def delete_project(project_id_or_key: str) -> Response:
         return http.delete(
@@ -35,12 +47,37 @@ class Projects:
             f"Deleting project with key {project_id_or_key}"
         )
 
+    @staticmethod
+    def delete_project_async(project_id_or_key: str) -> Response:
+        """
+        Starts deleting a project as a background task on the server. Jira answers
+        with a redirect to the task, which is followed, so the response is the task's
+        status. See api/teardown.py for tracking many of these at once
+        https://developer.atlassian.com/cloud/jira/platform/rest/v3/api-group-projects/#api-rest-api-3-project-projectidorkey-delete-post
+        """
+        return http.post(
+            f"/rest/api/3/project/{project_id_or_key}/delete",
+            f"Starting deletion of project with key {project_id_or_key}"
+        )
+
+    @staticmethod
+    def get_task(task_id: str) -> Response:
+        """
+        https://developer.atlassian.com/cloud/jira/platform/rest/v3/api-group-tasks/#api-rest-api-3-task-taskid-get
+        """
+        return http.get(
+            f"/rest/api/3/task/{task_id}",
+            f"Getting the status of task {task_id}"
+        )
+
     @staticmethod
     def assign_permission_scheme_to_project(project_key_or_id: str, scheme_id: int) -> Response:
         """
         https://developer.atlassian.com/cloud/jira/platform/rest/v3/api-group-project-permission-schemes/#api-rest-api-3-project-projectkeyorid-permissionscheme-put
         """
-        return http.put(
+        return http.set_payload({
+            "id": scheme_id
+        }).put(
             f"/rest/api/3/project/{project_key_or_id}/permissionscheme",
             f"Assigning permission scheme with ID {scheme_id} to project with key/ID {project_key_or_id}"
         )
@@ -55,20 +92,26 @@ class Projects:
             "description": description,
         }
 
-        return http.set_payload(payload).post(
+        response = http.set_payload(payload).post(
             "/rest/api/3/role",
             f"Creating project role {name}"
         )
+        if response.ok:
+            name_index.roles.add(name, response.json()["id"])
+        return response
 
     @staticmethod
     def delete_project_role(role_id: str) -> Response:
         """
         https://developer.atlassian.com/cloud/jira/platform/rest/v3/api-group-project-roles/#api-rest-api-3-role-id-delete
         """
-        return http.delete(
+        response = http.delete(
             f"/rest/api/3/role/{role_id}",
             f"Deleting project role {role_id}"
         )
+        if response.ok:
+            name_index.roles.discard(entity_id=role_id)
+        return response
 
     @staticmethod
     def add_actors_to_project_role(project_id_or_key: str, role_id: str,
@@ -87,6 +130,18 @@ class Projects:
             f"Assigning groups and/or users to roles with ID {role_id} to project with key/ID {project_id_or_key}"
         )
 
+    @staticmethod
+    def get_project_role_actors(project_id_or_key: str, role_id: str, cached: bool = True) -> Response:
+        """
+        With cached=False, the actors are always read from Jira rather than from the
+        request cache
+        https://developer.atlassian.com/cloud/jira/platform/rest/v3/api-group-project-roles/#api-rest-api-3-project-projectidorkey-role-id-get
+        """
+        return (http if cached else http.uncached()).get(
+            f"/rest/api/3/project/{project_id_or_key}/role/{role_id}",
+            f"Getting actors of role with ID {role_id} in project with key/ID {project_id_or_key}"
+        )
+
     @staticmethod
     def delete_user_from_project_role(project_id_or_key: str, role_id: str, user_id: str):
         """
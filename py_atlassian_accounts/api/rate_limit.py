@@ -0,0 +1,213 @@
+import constants
+
+from requests import Response
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import random
+import threading
+import time
+
+# Requests per second allowed to each Atlassian site, and how many may be sent in
+# a burst. Can be overridden by defining RATE_LIMIT and RATE_LIMIT_BURST in constants.py
+RATE_LIMIT = getattr(constants, "RATE_LIMIT", 20.0)
+RATE_LIMIT_BURST = getattr(constants, "RATE_LIMIT_BURST", 20)
+
+# How often a throttled (429) or unavailable (503) request is retried, and the
+# bounds of the exponential backoff between attempts, in seconds
+MAX_RETRIES = getattr(constants, "MAX_RETRIES", 5)
+BACKOFF_BASE = getattr(constants, "BACKOFF_BASE", 1.0)
+BACKOFF_MAX = getattr(constants, "BACKOFF_MAX", 60.0)
+
+RETRY_STATUSES = (429, 503)
+# A 429 is refused before the site does anything, so it is retried for every
+# method. A 503 can come from a proxy after the site has already made the change,
+# so it is only retried for methods that are safe to send twice
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+def should_retry(method: str, status_code: int) -> bool:
+    """
+    Whether a response with status_code to a method request can be sent again
+    """
+    return status_code == 429 or (status_code in RETRY_STATUSES and method in IDEMPOTENT_METHODS)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Converts a Retry-After or X-RateLimit-Reset header into a number of seconds
+    from now. Accepts a number of seconds, an HTTP date or an ISO 8601 timestamp
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket. acquire() blocks the calling thread until a token
+    is available, refilling at `rate` tokens per second up to `capacity`
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def set_rate(self, rate: float):
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+
+class RateLimiter:
+    """
+    Schedules requests to one Atlassian site so that bulk runs stay just under the
+    throughput the site allows:
+        - requests are paced by a token bucket of RATE_LIMIT requests per second
+        - 429 and 503 responses pause every request to the site for Retry-After
+          seconds, or a jittered exponential backoff when no header is given, and
+          halve the bucket's rate. Each success then recovers it gradually
+        - X-RateLimit-Remaining reaching 0 pauses requests until X-RateLimit-Reset
+
+    All clients for the same base url share one RateLimiter, see for_site()
+    """
+
+    _limiters: dict[str, "RateLimiter"] = {}
+    _limiters_lock = threading.Lock()
+
+    def __init__(self, rate: float = RATE_LIMIT, burst: int = RATE_LIMIT_BURST,
+                 max_retries: int = MAX_RETRIES, backoff_base: float = BACKOFF_BASE,
+                 backoff_max: float = BACKOFF_MAX):
+        self.max_rate = rate
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.lock = threading.Lock()
+        self.blocked_until = 0.0
+        self.limit: int | None = None
+        self.remaining: int | None = None
+        self.throttled = 0
+        self.retries = 0
+
+    @classmethod
+    def for_site(cls, url: str) -> "RateLimiter":
+        with cls._limiters_lock:
+            limiter = cls._limiters.get(url)
+            if limiter is None:
+                limiter = cls._limiters[url] = RateLimiter()
+            return limiter
+
+    def acquire(self):
+        """
+        Blocks until the site is no longer paused and a token is available
+        """
+        while True:
+            with self.lock:
+                wait = self.blocked_until - time.monotonic()
+            if wait <= 0:
+                break
+            time.sleep(wait)
+        self.bucket.acquire()
+
+    def set_max_rate(self, rate: float):
+        """
+        Changes the number of requests per second allowed to the site, e.g. from a
+        command line option. The bucket starts at the new rate straight away
+        """
+        self.max_rate = rate
+        self.bucket.set_rate(rate)
+
+    def pause(self, seconds: float):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def update(self, response: Response):
+        """
+        Records the rate limit headers and status of a response
+        """
+        headers = response.headers
+        with self.lock:
+            if "X-RateLimit-Limit" in headers:
+                self.limit = _int_or_none(headers["X-RateLimit-Limit"])
+            if "X-RateLimit-Remaining" in headers:
+                self.remaining = _int_or_none(headers["X-RateLimit-Remaining"])
+
+        if self.remaining == 0:
+            reset = parse_retry_after(headers.get("X-RateLimit-Reset"))
+            if reset:
+                self.pause(reset)
+
+        if response.status_code in RETRY_STATUSES:
+            with self.lock:
+                self.throttled += 1
+            self.bucket.set_rate(max(self.bucket.rate / 2, self.max_rate / 32))
+        elif self.bucket.rate < self.max_rate:
+            self.bucket.set_rate(min(self.max_rate, self.bucket.rate + self.max_rate / 20))
+
+    def backoff(self, attempt: int, response: Response) -> float:
+        """
+        Returns how long to wait before retrying a throttled response, and pauses
+        the whole site for that long
+        """
+        delay = parse_retry_after(response.headers.get("Retry-After"))
+        if delay is None:
+            # Full jitter spreads out the retries of many workers throttled at once
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        self.pause(delay)
+        with self.lock:
+            self.retries += 1
+        return delay
+
+    def state(self) -> dict:
+        """
+        A snapshot of the current throttle state of the site
+        """
+        with self.lock:
+            return {
+                "rate": self.bucket.rate,
+                "max_rate": self.max_rate,
+                "paused_for": max(self.blocked_until - time.monotonic(), 0.0),
+                "limit": self.limit,
+                "remaining": self.remaining,
+                "throttled": self.throttled,
+                "retries": self.retries,
+            }
+
+
+def _int_or_none(value: str) -> int | None:
+    try:
+        return int(value)
+    except ValueError:
+        return None
@@ -0,0 +1,169 @@
+from api.bulk import BULK_WORKERS, BulkReport, run_bulk
+from api.groups import Groups
+from api.projects import Projects
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable
+import logging
+
+# Role actor types, matching the ("<subject_type>", "<subject_id>") tuples
+# used by PermissionSchemes
+USER = "user"
+GROUP = "group"
+
+logger = logging.getLogger(__name__)
+
+
+def _actor(actor: str | tuple[str, str]) -> tuple[str, str]:
+    """
+    Normalises a role actor to a (subject_type, subject_id) tuple. Plain strings
+    are taken to be user account IDs
+    """
+    return (USER, actor) if isinstance(actor, str) else tuple(actor)
+
+
+def _role_actors(response_json: dict) -> set[tuple[str, str]]:
+    """
+    Extracts (subject_type, subject_id) tuples from a project role response
+    https://developer.atlassian.com/cloud/jira/platform/rest/v3/api-group-project-roles/#api-rest-api-3-project-projectidorkey-role-id-get
+    """
+    actors = set()
+    for actor in response_json.get("actors", []):
+        if "actorUser" in actor:
+            actors.add((USER, actor["actorUser"]["accountId"]))
+        elif "actorGroup" in actor:
+            actors.add((GROUP, actor["actorGroup"]["groupId"]))
+    return actors
+
+
+class ReconcilePlan:
+    """
+    The minimal set of changes that brings Jira in line with a desired state
+        group_adds/group_removes - (groupId, accountId) pairs
+        role_adds - {(project, role_id): {(subject_type, subject_id), ...}}
+        role_removes - (project, role_id, subject_type, subject_id) tuples
+    """
+
+    def __init__(self):
+        self.group_adds: list[tuple[str, str]] = []
+        self.group_removes: list[tuple[str, str]] = []
+        self.role_adds: dict[tuple[str, str], set[tuple[str, str]]] = {}
+        self.role_removes: list[tuple[str, str, str, str]] = []
+
+    def request_count(self) -> int:
+        """
+        The number of API calls apply() will make. Role additions for the same
+        project role are sent together as one call
+        """
+        return (len(self.group_adds) + len(self.group_removes)
+                + len(self.role_adds) + len(self.role_removes))
+
+    def __bool__(self) -> bool:
+        return self.request_count() > 0
+
+    def __repr__(self) -> str:
+        return (f"ReconcilePlan({len(self.group_adds)} group adds, {len(self.group_removes)} group removes, "
+                f"{sum(len(a) for a in self.role_adds.values())} role adds, "
+                f"{len(self.role_removes)} role removes)")
+
+
+class Reconciler:
+    """
+    Compares a desired state against the current Jira state and only sends the
+    calls needed to close the gap, so re-running a provisioning job costs API
+    calls in proportion to what changed rather than to the total enrollment.
+
+    desired_groups maps a groupId to the account IDs that should be its members:
+        {"myGroupId": {"accountId1", "accountId2"}}
+    desired_roles maps a project key/ID to role IDs to the actors that should hold
+    that role. Actors are account IDs or ("group", groupId) tuples:
+        {"PROJ": {"10002": {"accountId1", ("group", "tutorGroupId")}}}
+
+    By default nothing is ever removed. With prune=True, members and actors that
+    are not in the desired state are removed too, including ones a roster would
+    never list, such as admin groups holding a role. Only the groups and project
+    roles named in the desired state are ever read or changed
+    """
+
+    def __init__(self, desired_groups: dict[str, Iterable[str]] | None = None,
+                 desired_roles: dict[str, dict[str, Iterable]] | None = None,
+                 prune: bool = False, max_workers: int = BULK_WORKERS):
+        self.desired_groups = {group: set(members) for group, members in (desired_groups or {}).items()}
+        self.desired_roles = {
+            (project, role): {_actor(actor) for actor in actors}
+            for project, roles in (desired_roles or {}).items()
+            for role, actors in roles.items()
+        }
+        self.prune = prune
+        self.max_workers = max_workers
+
+    @staticmethod
+    def _current_group_members(group: str) -> set[str]:
+        return Groups.get_group_member_ids(group, cached=False)
+
+    @staticmethod
+    def _current_role_actors(project: str, role: str) -> set[tuple[str, str]]:
+        response = Projects.get_project_role_actors(project, role, cached=False)
+        response.raise_for_status()
+        return _role_actors(response.json())
+
+    def plan(self) -> ReconcilePlan:
+        """
+        Fetches the current members of every desired group and the actors of every
+        desired project role, and computes the add/remove diff. These reads skip the
+        request cache, so a plan made straight after a change sees that change
+        """
+        plan = ReconcilePlan()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            current_groups = executor.map(self._current_group_members, self.desired_groups)
+            current_roles = executor.map(lambda key: self._current_role_actors(*key), self.desired_roles)
+
+            for (group, desired), current in zip(self.desired_groups.items(), current_groups):
+                plan.group_adds += [(group, account_id) for account_id in sorted(desired - current)]
+                if self.prune:
+                    plan.group_removes += [(group, account_id) for account_id in sorted(current - desired)]
+
+            for ((project, role), desired), current in zip(self.desired_roles.items(), current_roles):
+                if desired - current:
+                    plan.role_adds[(project, role)] = desired - current
+                if self.prune:
+                    plan.role_removes += [(project, role, subject_type, subject_id)
+                                          for subject_type, subject_id in sorted(current - desired)]
+        return plan
+
+    def apply(self, plan: ReconcilePlan) -> BulkReport:
+        """
+        Sends the calls in a plan through the existing Groups and Projects methods
+        and returns a combined BulkReport of every call
+        """
+        if plan.group_removes or plan.role_removes:
+            logger.warning(f"Removing {len(plan.group_removes)} group members and "
+                           f"{len(plan.role_removes)} project role actors")
+        results = []
+        results += run_bulk(Groups.add_user_to_group, plan.group_adds, self.max_workers).results
+        results += run_bulk(Groups.remove_user_from_group, plan.group_removes, self.max_workers).results
+        results += run_bulk(
+            Projects.add_actors_to_project_role,
+            [
+                (project, role,
+                 sorted(subject_id for subject_type, subject_id in actors if subject_type == GROUP),
+                 sorted(subject_id for subject_type, subject_id in actors if subject_type == USER))
+                for (project, role), actors in plan.role_adds.items()
+            ],
+            self.max_workers
+        ).results
+        results += run_bulk(_remove_role_actor, plan.role_removes, self.max_workers).results
+        return BulkReport(results)
+
+    def reconcile(self, dry_run: bool = False) -> tuple[ReconcilePlan, BulkReport | None]:
+        """
+        Plans and, unless dry_run is set, applies the changes
+        """
+        plan = self.plan()
+        return plan, (None if dry_run or not plan else self.apply(plan))
+
+
+def _remove_role_actor(project: str, role: str, subject_type: str, subject_id: str):
+    if subject_type == GROUP:
+        return Projects.delete_group_from_project_role(project, role, subject_id)
+    return Projects.delete_user_from_project_role(project, role, subject_id)
@@ -0,0 +1,165 @@
+from api.response import ApiResponse
+from api import metrics
+import constants
+
+from collections import OrderedDict
+from typing import Callable, Mapping
+import logging
+import re
+import threading
+import time
+
+# Most GET responses kept by the cache at once. The least recently used are
+# dropped first. Can be overridden by defining CACHE_SIZE in constants.py
+CACHE_SIZE = getattr(constants, "CACHE_SIZE", 256)
+
+# Seconds a successful GET response is reused for, by endpoint template (see
+# metrics.endpoint_template). Endpoints not listed are not cached, but identical
+# GETs in flight at the same time still share one request. Streamed GETs, such as
+# the role and permission scheme lists name_index reads, are never cached.
+# Can be overridden by defining CACHE_TTLS in constants.py
+CACHE_TTLS = getattr(constants, "CACHE_TTLS", {
+    "/rest/api/3/group/bulk": 30,
+    "/rest/api/3/project/{id}/role/{id}": 30,
+})
+
+# The api prefix before a resource name, e.g. /rest/api/3/ or /rest/api/
+_API_PREFIX = re.compile(r"^/?(wiki/)?rest/api/(\d+/)?")
+
+logger = logging.getLogger(__name__)
+
+
+def resource_of(endpoint: str) -> str:
+    """
+    The resource an endpoint belongs to, e.g. "group" for /rest/api/3/group/member
+    and "project" for /rest/api/3/project/PROJ/role/10002. A POST, PUT or DELETE
+    invalidates every cached GET of the same resource
+    """
+    return _API_PREFIX.sub("", endpoint.split("?", 1)[0]).split("/", 1)[0]
+
+
+def _freeze(queries: Mapping) -> tuple:
+    return tuple(sorted((key, tuple(value) if isinstance(value, list) else value)
+                        for key, value in queries.items()))
+
+
+class _Flight:
+    """
+    A GET in flight, which identical GETs wait on instead of sending their own
+    """
+
+    __slots__ = ("done", "response", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response: ApiResponse | None = None
+        self.error: BaseException | None = None
+
+
+class RequestCache:
+    """
+    Coalesces and caches the GETs sent by Http clients:
+        - identical GETs (same site, endpoint and queries) in flight at the same
+          time share one request. The first sends it and the rest wait for its
+          response
+        - successful responses of the endpoints in ttls are kept for that many
+          seconds, up to max_entries responses in least recently used order
+        - a POST, PUT or DELETE drops every cached response of the same resource
+          on the same site (see resource_of()), and a GET that was in flight while
+          it happened is not cached
+
+    Callers sharing a response also share its decoded body, so json() results
+    returned by cached GETs must be treated as read only
+    """
+
+    def __init__(self, max_entries: int = CACHE_SIZE, ttls: Mapping[str, float] = CACHE_TTLS):
+        self.max_entries = max_entries
+        self.ttls = ttls
+        # (url, resource, endpoint, queries) -> (response, expiry time)
+        self.entries: OrderedDict[tuple, tuple[ApiResponse, float]] = OrderedDict()
+        self.in_flight: dict[tuple, _Flight] = {}
+        # (url, resource) -> number of mutations seen
+        self.generations: dict[tuple[str, str], int] = {}
+        self.lock = threading.Lock()
+
+    def get(self, url: str, endpoint: str, queries: Mapping,
+            fetch: Callable[[], ApiResponse]) -> ApiResponse:
+        """
+        Returns the cached or in flight response for a GET, or calls fetch to send it
+        """
+        endpoint = f"/{endpoint.lstrip('/')}"
+        resource = resource_of(endpoint)
+        key = (url, resource, endpoint, _freeze(queries))
+        template = metrics.endpoint_template(endpoint)
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    self.entries.move_to_end(key)
+                    metrics.cache_hits.inc("GET", template, "cache")
+                    logger.debug("Reusing the cached response for GET %s%s", url, endpoint)
+                    return entry[0]
+                del self.entries[key]
+            flight = self.in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.in_flight[key] = _Flight()
+                generation = self.generations.get((url, resource), 0)
+
+        if not leader:
+            flight.done.wait()
+            metrics.cache_hits.inc("GET", template, "in_flight")
+            logger.debug("Sharing the response of an identical GET %s%s in flight", url, endpoint)
+            if flight.error is not None:
+                raise flight.error
+            return flight.response
+
+        try:
+            response = fetch()
+            if response.ok and response.content:
+                # Decode once here rather than once per caller sharing the response
+                try:
+                    response.json()
+                except ValueError:
+                    pass
+            flight.response = response
+            return response
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                if self.in_flight.get(key) is flight:
+                    del self.in_flight[key]
+                ttl = self.ttls.get(template, 0)
+                if (flight.response is not None and flight.response.ok and ttl > 0
+                        and self.generations.get((url, resource), 0) == generation):
+                    self.entries[key] = (flight.response, time.monotonic() + ttl)
+                    self.entries.move_to_end(key)
+                    while len(self.entries) > self.max_entries:
+                        self.entries.popitem(last=False)
+            flight.done.set()
+
+    def invalidate(self, url: str, endpoint: str):
+        """
+        Drops every cached response of the resource endpoint belongs to, and
+        stops GETs of it already in flight from being cached or joined
+        """
+        resource = resource_of(f"/{endpoint.lstrip('/')}")
+        with self.lock:
+            self.generations[(url, resource)] = self.generations.get((url, resource), 0) + 1
+            for store in (self.entries, self.in_flight):
+                for key in [key for key in store if key[0] == url and key[1] == resource]:
+                    del store[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+# The cache shared by every Http client
+request_cache = RequestCache()
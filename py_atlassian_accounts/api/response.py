@@ -0,0 +1,188 @@
+from api import serialization
+
+from requests import Response
+from typing import Iterable, Iterator
+import codecs
+import json
+
+# Size of the chunks read from streamed response bodies
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\r\n"
+# The characters that can follow a complete number in a list
+_NUMBER_ENDS = _WHITESPACE + ",]"
+_decoder = json.JSONDecoder()
+# Marks a body that has not been decoded yet. None can't be used, since it is
+# what a JSON null body decodes to
+_UNSET = object()
+
+
+class ApiResponse(Response):
+    """
+    The Response returned by every Http call. It behaves exactly like a
+    requests.Response, except that:
+        - json() decodes the body at most once, with the decoder chosen in
+          serialization.py, and caches the result, so the body is never parsed
+          more than once however many times json() is called.
+          Callers that only need the status code never decode it at all
+        - iter_items() reads a large JSON list out of a streamed body one item at a
+          time, so memory stays flat however long the list is. See Http.streaming()
+    """
+
+    # The decoded body is left out of __attrs__, so a pickled response decodes
+    # its body again when needed instead of carrying a copy of _UNSET that is
+    # no longer the same object
+    _json = _UNSET
+
+    @classmethod
+    def wrap(cls, response: Response) -> "ApiResponse":
+        """
+        Returns an ApiResponse that shares the state of an existing Response
+        """
+        wrapped = cls.__new__(cls)
+        wrapped.__dict__.update(response.__dict__)
+        wrapped._json = _UNSET
+        return wrapped
+
+    def json(self, **kwargs):
+        if kwargs:
+            return super().json(**kwargs)
+        if self._json is _UNSET:
+            self._json = serialization.loads(self.content)
+        return self._json
+
+    @property
+    def is_streamed(self) -> bool:
+        """
+        True if the body has not been read yet, i.e. the request was sent with
+        stream=True and nothing has consumed the body
+        """
+        return self._content is False
+
+    def iter_items(self, key: str | None = None) -> Iterator:
+        """
+        Yields the items of a JSON list in the body one at a time. key names the list
+        in a top level object, e.g. "permissionSchemes" or "values"; without a key
+        the body itself must be a list.
+
+        On a streamed response, the body is read in CHUNK_SIZE chunks and only one
+        item is held in memory at a time; the response is closed once the list ends.
+        On a response that was already read, the decoded body is used instead
+        """
+        if not self.is_streamed:
+            body = self.json()
+            yield from (body if key is None else body.get(key, []))
+            return
+        try:
+            yield from iter_json_list(self.iter_content(CHUNK_SIZE), key, self.encoding or "utf-8")
+        finally:
+            self.close()
+
+
+def _find_list(text: str, key: str | None, state: dict) -> int | None:
+    """
+    Scans text for the opening bracket of the wanted list, carrying the scanner's
+    position in state between calls. Returns the index just after the bracket,
+    or None if it has not been reached yet
+    """
+    i = state["pos"]
+    while i < len(text):
+        char = text[i]
+        if state["in_string"]:
+            if state["escape"]:
+                state["escape"] = False
+            elif char == "\\":
+                state["escape"] = True
+            elif char == '"':
+                state["in_string"] = False
+                if state["depth"] == 1:
+                    state["last_string"] = text[state["string_start"]:i]
+        elif char == '"':
+            state["in_string"] = True
+            state["string_start"] = i + 1
+        elif char == ":" and state["depth"] == 1:
+            state["current_key"] = state["last_string"]
+        elif char in "{[":
+            if char == "[" and ((key is None and state["depth"] == 0)
+                                or (state["depth"] == 1 and state["current_key"] == key)):
+                return i + 1
+            state["depth"] += 1
+        elif char in "}]":
+            state["depth"] -= 1
+            if state["depth"] == 0:
+                if key is None:
+                    raise ValueError("The response body is not a JSON list")
+                raise ValueError(f"No list named {key!r} in the response body")
+        i += 1
+    state["pos"] = i
+    return None
+
+
+def iter_json_list(chunks: Iterable[bytes], key: str | None = None,
+                   encoding: str = "utf-8") -> Iterator:
+    """
+    Incrementally decodes the items of a JSON list from a stream of byte chunks.
+    With a key, the list is the value of that key in the top level object;
+    otherwise the top level value must be the list
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    buffer = ""
+    state = {"pos": 0, "depth": 0, "in_string": False, "escape": False,
+             "string_start": 0, "last_string": None, "current_key": None}
+    chunks = iter(chunks)
+    start = None
+    exhausted = False
+    # Where decoding carries on from. Everything in the buffer before it has been
+    # decoded already, and is only dropped when the next chunk is appended, so
+    # the buffer is copied once per chunk rather than once per item
+    pos = 0
+
+    def read() -> bool:
+        nonlocal buffer, pos, exhausted
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+            buffer = buffer[pos:] + decoder.decode(b"", final=True)
+        else:
+            buffer = buffer[pos:] + decoder.decode(chunk)
+        pos = 0
+        return chunk is not None
+
+    # Find the start of the list
+    while start is None:
+        start = _find_list(buffer, key, state)
+        if start is None and not read():
+            if key is None:
+                raise ValueError("The response body is not a JSON list")
+            raise ValueError(f"No list named {key!r} in the response body")
+    pos = start
+
+    # Decode one item at a time, reading more of the body whenever the buffer
+    # ends part way through an item
+    while True:
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        if pos == len(buffer):
+            if not read():
+                raise ValueError("The response body ended inside a JSON list")
+            continue
+        if buffer[pos] == "]":
+            return
+        if buffer[pos] == ",":
+            pos += 1
+            continue
+        try:
+            item, end = _decoder.raw_decode(buffer, pos)
+        except ValueError:
+            if exhausted:
+                raise
+            read()
+            continue
+        if (not exhausted and isinstance(item, (int, float)) and not isinstance(item, bool)
+                and (end == len(buffer) or buffer[end] not in _NUMBER_ENDS)):
+            # A number at the end of the buffer may continue in the next chunk,
+            # e.g. "-1." decodes as -1 before the rest of "-1.5" arrives
+            read()
+            continue
+        yield item
+        pos = end
@@ -0,0 +1,177 @@
+from api.projects import Projects
+import constants
+
+from requests import Response
+import logging
+import threading
+import time
+
+# The most actors sent in a single role-actor call.
+# Can be overridden by defining ROLE_BATCH_SIZE in constants.py
+ROLE_BATCH_SIZE = getattr(constants, "ROLE_BATCH_SIZE", 50)
+
+USER = "user"
+GROUP = "group"
+
+logger = logging.getLogger(__name__)
+
+
+class ActorResult:
+    """
+    The outcome of adding one actor to a project role
+    """
+
+    __slots__ = ("project", "role", "actor_type", "actor_id", "status_code", "error")
+
+    def __init__(self, project: str, role: str, actor_type: str, actor_id: str,
+                 status_code: int | None = None, error: BaseException | None = None):
+        self.project = project
+        self.role = role
+        self.actor_type = actor_type
+        self.actor_id = actor_id
+        self.status_code = status_code
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.status_code is not None and self.status_code < 400
+
+    def __repr__(self) -> str:
+        return (f"ActorResult(project={self.project!r}, role={self.role!r}, {self.actor_type}={self.actor_id!r}, "
+                f"status_code={self.status_code}, error={self.error!r})")
+
+
+class RoleActorBatcher:
+    """
+    Buffers (project, role, actor) assignments and sends them as batched
+    Projects.add_actors_to_project_role calls, turning N single-actor requests
+    into roughly N / max_batch_size requests.
+
+    Assignments are grouped by (project, role). A group is sent when it reaches
+    max_batch_size actors, when its oldest assignment has waited max_delay seconds
+    (if set), or on flush(). When a batch is rejected with a 400 that names some of
+    its actors, the actors are retried one by one so each failure is attributed to
+    the actor that caused it. Any other failure, such as a missing project or role
+    or an outage, is reported for every actor in the batch without retrying.
+
+    Use as a context manager to flush whatever is left on exit:
+        with RoleActorBatcher() as batcher:
+            for record in roster:
+                batcher.add_user(record.project_key, role_id, record.user)
+        failures = [result for result in batcher.results if not result.ok]
+    """
+
+    def __init__(self, max_batch_size: int = ROLE_BATCH_SIZE, max_delay: float | None = None):
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.results: list[ActorResult] = []
+        self.requests_sent = 0
+
+        self._pending: dict[tuple[str, str], list[tuple[str, str]]] = {}
+        self._first_added: dict[tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._timer = None
+        if max_delay is not None:
+            self._timer = threading.Thread(target=self._flush_on_time, daemon=True,
+                                           name="RoleActorBatcher")
+            self._timer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add_user(self, project_id_or_key: str, role_id: str, account_id: str):
+        self._add(project_id_or_key, role_id, (USER, account_id))
+
+    def add_group(self, project_id_or_key: str, role_id: str, group_id: str):
+        self._add(project_id_or_key, role_id, (GROUP, group_id))
+
+    def _add(self, project: str, role: str, actor: tuple[str, str]):
+        key = (project, role)
+        with self._lock:
+            actors = self._pending.setdefault(key, [])
+            if actor in actors:
+                return
+            actors.append(actor)
+            self._first_added.setdefault(key, time.monotonic())
+            batch = self._take(key) if len(actors) >= self.max_batch_size else None
+        if batch:
+            self._send(key, batch)
+
+    def _take(self, key: tuple[str, str]) -> list[tuple[str, str]]:
+        # Must be called with self._lock held
+        self._first_added.pop(key, None)
+        return self._pending.pop(key, [])
+
+    def flush(self):
+        """
+        Sends every buffered assignment now
+        """
+        with self._lock:
+            batches = [(key, self._take(key)) for key in list(self._pending)]
+        for key, batch in batches:
+            for start in range(0, len(batch), self.max_batch_size):
+                self._send(key, batch[start:start + self.max_batch_size])
+
+    def close(self):
+        self._closed.set()
+        if self._timer is not None:
+            self._timer.join()
+        self.flush()
+
+    def _flush_on_time(self):
+        while not self._closed.wait(self.max_delay / 2):
+            cutoff = time.monotonic() - self.max_delay
+            with self._lock:
+                batches = [(key, self._take(key)) for key, added in list(self._first_added.items())
+                           if added <= cutoff]
+            for key, batch in batches:
+                self._send(key, batch)
+
+    @staticmethod
+    def _post(project: str, role: str, actors: list[tuple[str, str]]) -> Response:
+        return Projects.add_actors_to_project_role(
+            project, role,
+            [actor_id for actor_type, actor_id in actors if actor_type == GROUP],
+            [actor_id for actor_type, actor_id in actors if actor_type == USER],
+        )
+
+    @staticmethod
+    def _names_actors(response: Response | None, actors: list[tuple[str, str]]) -> bool:
+        """
+        True if response is a validation error that blames some of the actors, so
+        retrying them one by one tells the rejected actors from the rest
+        """
+        if response is None or response.status_code != 400:
+            return False
+        text = response.text
+        return any(actor_id in text for _, actor_id in actors)
+
+    def _send(self, key: tuple[str, str], actors: list[tuple[str, str]]):
+        project, role = key
+        response, results = self._attempt(project, role, actors)
+        if len(actors) > 1 and self._names_actors(response, actors):
+            # Retry one actor at a time to find out which ones were rejected
+            logger.warning(f"Batch of {len(actors)} actors for role {role} in {project} was rejected, "
+                           f"retrying individually")
+            results = [result for actor in actors for result in self._attempt(project, role, [actor])[1]]
+        elif not all(result.ok for result in results):
+            logger.error(f"Batch of {len(actors)} actors for role {role} in {project} failed: "
+                         f"{results[0].error or results[0].status_code}")
+        with self._lock:
+            self.results += results
+
+    def _attempt(self, project: str, role: str,
+                 actors: list[tuple[str, str]]) -> tuple[Response | None, list[ActorResult]]:
+        with self._lock:
+            self.requests_sent += 1
+        try:
+            response, error = self._post(project, role, actors), None
+            status_code = response.status_code
+        except Exception as e:
+            response, status_code, error = None, None, e
+        return response, [ActorResult(project, role, actor_type, actor_id, status_code, error)
+                          for actor_type, actor_id in actors]
@@ -0,0 +1,295 @@
+from api.bulk import BULK_WORKERS
+from api.groups import Groups
+from api.permission_schemes import PermissionSchemes
+from api.projects import Projects
+from api.spaces import Spaces
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from requests import Response
+from typing import Any, Callable, Iterable
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Step statuses
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+class Ref:
+    """
+    A placeholder for the output of an earlier step, replaced with that output
+    when the step holding it is run. Refs may be passed as arguments, or inside
+    list, tuple or dict arguments
+    """
+
+    __slots__ = ("step",)
+
+    def __init__(self, step: str):
+        self.step = step
+
+    def __repr__(self) -> str:
+        return f"Ref({self.step!r})"
+
+
+class Step:
+    """
+    One node of a ProvisioningGraph
+        name - Unique within the graph, e.g. "COMP1000/group"
+        func, args - The call to make. Any Ref in args is resolved first
+        output - How to read the step's output from what func returns:
+            a key of the response JSON, a callable taking the return value, or
+            None for no output
+        depends - The steps that must succeed before this one runs: every step
+            referenced by a Ref in args, plus any passed as after
+    """
+
+    __slots__ = ("name", "func", "args", "output", "depends")
+
+    def __init__(self, name: str, func: Callable, args: tuple,
+                 output: str | Callable[[Any], Any] | None, depends: tuple[str, ...]):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.output = output
+        self.depends = depends
+
+    def __repr__(self) -> str:
+        return f"Step({self.name!r}, depends={self.depends})"
+
+
+def _refs(value) -> Iterable[str]:
+    if isinstance(value, Ref):
+        yield value.step
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _refs(item)
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _refs(item)
+
+
+def _resolve(value, outputs: dict[str, Any]):
+    if isinstance(value, Ref):
+        return outputs[value.step]
+    if isinstance(value, (list, tuple)):
+        return type(value)(_resolve(item, outputs) for item in value)
+    if isinstance(value, dict):
+        return {key: _resolve(item, outputs) for key, item in value.items()}
+    return value
+
+
+class ProvisioningGraph:
+    """
+    A dependency graph of provisioning steps. A step can only depend on steps
+    added before it, so the graph can never contain a cycle
+    """
+
+    def __init__(self):
+        self.steps: dict[str, Step] = {}
+
+    def add(self, name: str, func: Callable, *args, output: str | Callable | None = None,
+            after: Iterable[str] = ()) -> Ref:
+        """
+        Adds a step and returns a Ref to its output, to be passed to later steps, e.g.
+            group = graph.add("COMP1000/group", Groups.create_group, "COMP1000", output="groupId")
+            graph.add("COMP1000/member", Groups.add_user_to_group, group, "accountId")
+        """
+        if name in self.steps:
+            raise ValueError(f"A step named {name!r} has already been added")
+        depends = tuple(dict.fromkeys([*_refs(args), *after]))
+        for dependency in depends:
+            if dependency not in self.steps:
+                raise ValueError(f"Step {name!r} depends on {dependency!r}, which has not been added")
+        self.steps[name] = Step(name, func, args, output, depends)
+        return Ref(name)
+
+    def dependents(self) -> dict[str, list[str]]:
+        """
+        Maps each step to the steps that depend on it directly
+        """
+        dependents = {name: [] for name in self.steps}
+        for step in self.steps.values():
+            for dependency in step.depends:
+                dependents[dependency].append(step.name)
+        return dependents
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+
+class StepResult:
+    """
+    The outcome of one step
+        status - DONE, FAILED or SKIPPED
+        output - The step's output, if it succeeded
+        response - The Response the step returned, if any
+        error - Why the step failed, or the failed step that caused it to be skipped
+    """
+
+    __slots__ = ("name", "status", "output", "response", "error")
+
+    def __init__(self, name: str, status: str, output=None, response: Response | None = None,
+                 error: str | None = None):
+        self.name = name
+        self.status = status
+        self.output = output
+        self.response = response
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.status == DONE
+
+    def __repr__(self) -> str:
+        return f"StepResult({self.name!r}, {self.status}, output={self.output!r}, error={self.error!r})"
+
+
+class ScheduleReport:
+    """
+    The result of every step in a graph, keyed by step name
+    """
+
+    def __init__(self, results: dict[str, StepResult]):
+        self.results = results
+
+    def with_status(self, status: str) -> list[StepResult]:
+        return [result for result in self.results.values() if result.status == status]
+
+    @property
+    def failures(self) -> list[StepResult]:
+        return self.with_status(FAILED)
+
+    @property
+    def skipped(self) -> list[StepResult]:
+        return self.with_status(SKIPPED)
+
+    def __getitem__(self, name: str) -> StepResult:
+        return self.results[name]
+
+    def __repr__(self) -> str:
+        return (f"ScheduleReport({len(self.with_status(DONE))} done, {len(self.failures)} failed, "
+                f"{len(self.skipped)} skipped)")
+
+
+class Scheduler:
+    """
+    Runs a ProvisioningGraph on a pool of max_workers threads, which caps the
+    number of requests in flight across the whole graph. A step starts as soon as
+    every step it depends on has succeeded, so independent branches and
+    independent courses run side by side. Ready steps are started in the order
+    they were added.
+
+    When a step fails, every step that depends on it, directly or not, is
+    skipped; the rest of the graph carries on
+    """
+
+    def __init__(self, max_workers: int = BULK_WORKERS,
+                 on_result: Callable[[StepResult], None] | None = None):
+        self.max_workers = max_workers
+        self.on_result = on_result
+
+    def run(self, graph: ProvisioningGraph) -> ScheduleReport:
+        order = {name: index for index, name in enumerate(graph.steps)}
+        dependents = graph.dependents()
+        waiting_on = {name: len(step.depends) for name, step in graph.steps.items()}
+        ready = [name for name, count in waiting_on.items() if count == 0]
+        outputs: dict[str, Any] = {}
+        results: dict[str, StepResult] = {}
+        futures: dict[Future, str] = {}
+
+        def finish(result: StepResult):
+            results[result.name] = result
+            if self.on_result is not None:
+                self.on_result(result)
+
+        def skip_dependents(name: str):
+            stack = list(dependents[name])
+            while stack:
+                dependent = stack.pop()
+                if dependent not in results:
+                    logger.warning(f"Skipping step {dependent} as step {name} failed")
+                    finish(StepResult(dependent, SKIPPED, error=f"Depends on failed step {name}"))
+                    stack.extend(dependents[dependent])
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="scheduler") as executor:
+            while ready or futures:
+                # Keep no more steps queued than there are workers, so that
+                # steps becoming ready later are not stuck behind a long queue
+                ready.sort(key=order.__getitem__, reverse=True)
+                while ready and len(futures) < self.max_workers:
+                    name = ready.pop()
+                    step = graph.steps[name]
+                    futures[executor.submit(self._run_step, step, _resolve(step.args, outputs))] = name
+
+                finished, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = futures.pop(future)
+                    result = future.result()
+                    finish(result)
+                    if not result.ok:
+                        logger.error(f"Step {name} failed: {result.error}")
+                        skip_dependents(name)
+                        continue
+                    outputs[name] = result.output
+                    for dependent in dependents[name]:
+                        waiting_on[dependent] -= 1
+                        if waiting_on[dependent] == 0 and dependent not in results:
+                            ready.append(dependent)
+
+        return ScheduleReport(results)
+
+    @staticmethod
+    def _run_step(step: Step, args: tuple) -> StepResult:
+        try:
+            value = step.func(*args)
+            response = value if isinstance(value, Response) else None
+            if response is not None and not response.ok:
+                return StepResult(step.name, FAILED, response=response,
+                                  error=f"HTTP {response.status_code}: {response.text[:200]}")
+            if step.output is None:
+                output = None
+            elif callable(step.output):
+                output = step.output(value)
+            else:
+                output = response.json()[step.output] if response is not None else value[step.output]
+            return StepResult(step.name, DONE, output, response)
+        except Exception as e:
+            return StepResult(step.name, FAILED, error=f"{type(e).__name__}: {e}")
+
+
+def _create_course_scheme(group_id: str, scheme_name: str):
+    return PermissionSchemes().add_student_group_permissions(group_id).create_permission_scheme(
+        f"Permissions for {scheme_name}", scheme_name)
+
+
+def _create_course_space(group_id: str, name: str, key: str, description: str):
+    return Spaces(name, key, description).add_user_permissions("group", group_id, 1).create_space()
+
+
+def add_course(graph: ProvisioningGraph, code: str, name: str, project_key: str,
+               space_key: str, role_id: str) -> dict[str, Ref]:
+    """
+    Adds the steps that set up one course to graph and returns a Ref to each:
+        group - Groups.create_group, for the course's students
+        scheme - PermissionSchemes.create_permission_scheme, granting the group
+            student permissions (needs group)
+        project - Projects.create_scrum_project
+        assign - Projects.assign_permission_scheme_to_project (needs project, scheme)
+        role - Projects.add_actors_to_project_role, giving the group role_id in
+            the project (needs project, group)
+        space - Spaces.create_space, with user permissions for the group (needs group)
+    """
+    group = graph.add(f"{code}/group", Groups.create_group, f"{code} Students", output="groupId")
+    scheme = graph.add(f"{code}/scheme", _create_course_scheme, group, f"{code} Permission Scheme",
+                       output="id")
+    project = graph.add(f"{code}/project", Projects.create_scrum_project, name, project_key,
+                        output="key")
+    assign = graph.add(f"{code}/assign", Projects.assign_permission_scheme_to_project, project, scheme)
+    role = graph.add(f"{code}/role", Projects.add_actors_to_project_role, project, role_id, [group], [])
+    space = graph.add(f"{code}/space", _create_course_space, group, name, space_key,
+                      f"Confluence space for {name}")
+    return {"group": group, "scheme": scheme, "project": project, "assign": assign,
+            "role": role, "space": space}
@@ -0,0 +1,82 @@
+import constants
+
+from typing import Callable
+import json
+import logging
+
+try:
+    import orjson
+except ImportError:
+    # orjson is optional, the standard library encoder is used without it
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+class JsonBackend:
+    """
+    A JSON encoder and decoder pair
+        dumps - Encodes an object as compact UTF-8 bytes
+        loads - Decodes bytes or str
+    """
+
+    __slots__ = ("name", "dumps", "loads")
+
+    def __init__(self, name: str, dumps: Callable[[object], bytes], loads: Callable[[bytes | str], object]):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+    def __repr__(self) -> str:
+        return f"JsonBackend({self.name!r})"
+
+
+def _json_dumps(obj) -> bytes:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+BACKENDS: dict[str, JsonBackend] = {"json": JsonBackend("json", _json_dumps, json.loads)}
+if orjson is not None:
+    BACKENDS["orjson"] = JsonBackend("orjson", orjson.dumps, orjson.loads)
+
+# The backend used for request payloads, response bodies and logs: orjson when it
+# is installed, else the standard library. Can be overridden by defining
+# JSON_BACKEND in constants.py
+JSON_BACKEND = getattr(constants, "JSON_BACKEND", "orjson" if orjson is not None else "json")
+
+
+def register_backend(name: str, dumps: Callable[[object], bytes], loads: Callable[[bytes | str], object]):
+    """
+    Makes another encoder and decoder available to use_backend()
+    """
+    BACKENDS[name] = JsonBackend(name, dumps, loads)
+
+
+def use_backend(name: str) -> JsonBackend:
+    """
+    Switches every later dumps() and loads() to the backend called name
+    """
+    global backend
+    backend = BACKENDS[name]
+    return backend
+
+
+def dumps(obj) -> bytes:
+    """
+    Encodes obj as compact JSON, with no spaces after separators and non ASCII
+    characters left as UTF-8
+    """
+    return backend.dumps(obj)
+
+
+def loads(data: bytes | str):
+    """
+    Decodes a JSON document. Raises a ValueError if it is not valid JSON
+    """
+    return backend.loads(data)
+
+
+if JSON_BACKEND not in BACKENDS:
+    logger.warning(f"JSON backend {JSON_BACKEND} is not available, using json instead")
+    JSON_BACKEND = "json"
+backend = BACKENDS[JSON_BACKEND]
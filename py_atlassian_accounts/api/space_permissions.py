@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 USER_PERMISSIONS = [
         # Allow students just to read the space
         ("read", "space"),
@@ -50,6 +52,21 @@ ADMIN_PERMISSIONS = [
 ]
 
 
+@lru_cache(maxsize=None)
+def compile_permissions(perms: tuple[tuple[str, str], ...]) -> tuple[dict, ...]:
+    """
+    Compiles a template of (operation, target type) tuples into the operation dicts
+    used in the permissions payload, once per distinct template. Duplicate
+    permissions (such as the repeated ("delete", "attachment") in ADMIN_PERMISSIONS)
+    are dropped, keeping the order they were first given in.
+    The returned dicts are shared between every subject and must not be modified
+    """
+    return tuple(
+        {"operation": operation, "targetType": target_type}
+        for operation, target_type in dict.fromkeys(perms)
+    )
+
+
 class SpacePermissions:
     """
     A set of permissions given to either a group of a user
@@ -59,8 +76,10 @@ class SpacePermissions:
     https://developer.atlassian.com/cloud/confluence/rest/v1/api-group-space/#api-wiki-rest-api-space-post
     """
 
+    __slots__ = ("subject_type", "subject_id", "size", "perms")
+
     def __init__(self, subject_type: str, subject_id: str,
-                 size: int, perms: list[tuple[str, str]] = []) -> None:
+                 size: int, perms: list[tuple[str, str]] | None = None) -> None:
         """
         https://developer.atlassian.com/cloud/confluence/rest/v1/api-group-space/#api-wiki-rest-api-space-post
         subject_type: "user" or "group"
@@ -72,7 +91,7 @@ class SpacePermissions:
         self.subject_type = subject_type
         self.subject_id = subject_id
         self.size = size
-        self.perms = perms
+        self.perms = [tuple(perm) for perm in perms or []]
 
     def id_name(self) -> str:
         """
@@ -89,11 +108,11 @@ class SpacePermissions:
                 return ""
 
     def add_permission(self, perm: tuple[str, str]):
-        self.perms += [perm]
+        self.perms.append(tuple(perm))
         return self
 
     def add_permissions(self, perms: list[tuple[str, str]]):
-        self.perms += perms
+        self.perms += [tuple(perm) for perm in perms]
         return self
 
     def permissions_list(self) -> list:
@@ -102,26 +121,28 @@ class SpacePermissions:
         and returns that list
         Follows the payload structure in the below link:
         https://developer.atlassian.com/cloud/confluence/rest/v1/api-group-space/#api-wiki-rest-api-space-post
+
+        The operation dicts come from the compiled template for self.perms, and one
+        subjects dict is shared by every permission of this subject, so only the
+        small outer dict is built per permission
         """
+        subjects = {
+            self.subject_type: {
+                "results": [
+                    {
+                        "type": self.subject_type,
+                        self.id_name(): self.subject_id,
+                    }
+                ],
+                "size": self.size
+            }
+        }
         return [
             {
-                "subjects": {
-                    self.subject_type: {
-                        "results": [
-                            {
-                                "type": self.subject_type,
-                                self.id_name(): self.subject_id,
-                            }
-                        ],
-                        "size": self.size
-                    }
-                },
-                "operation": {
-                    "operation": operation,
-                    "targetType": target_type
-                },
+                "subjects": subjects,
+                "operation": operation,
                 "anonymousAccess": False,
                 "unlicensedAccess": False,
             }
-            for operation, target_type in self.perms
+            for operation in compile_permissions(tuple(self.perms))
         ]
@@ -1,7 +1,9 @@
 from api.http import Http
+from api.pagination import iter_confluence
 from api.space_permissions import ADMIN_PERMISSIONS, USER_PERMISSIONS, SpacePermissions
 
 from requests import Response
+from typing import Iterator
 
 http = Http.confluence()
 
@@ -11,7 +13,7 @@ class Spaces:
     An object for manipulating confluence spaces
     """
 
-    def __init__(self, name: str, key: str, description: str, permissions: list = []):
+    def __init__(self, name: str, key: str, description: str, permissions: list | None = None):
         """
         :param str name: The name of the space
         :param str key: The unique key for the space
@@ -22,7 +24,7 @@ class Spaces:
         self.name = name
         self.key = key
         self.description = description
-        self.permissions = permissions
+        self.permissions = list(permissions or [])
 
     def add_permissions(self, subject_type: str, subject_id: str,
                         size: int, perms: list[tuple[str, str]]):
@@ -99,11 +101,20 @@ class Spaces:
         """
         https://developer.atlassian.com/cloud/confluence/rest/v1/api-group-space/#api-wiki-rest-api-space-post
         """
-        return http.set_payload(self.payload).post(
+        return http.set_payload(self.payload()).post(
             "/rest/api/space",
             f"Creating space {self.name} in Confluence...",
         )
 
+    @staticmethod
+    def iter_spaces(prefetch: bool = False) -> Iterator[dict]:
+        """
+        Lazily yields every space in Confluence, one page at a time
+        https://developer.atlassian.com/cloud/confluence/rest/v1/api-group-space/#api-wiki-rest-api-space-get
+        """
+        return iter_confluence("/rest/api/space", "Listing spaces in Confluence...",
+                               prefetch=prefetch, client=http)
+
     @staticmethod
     def delete_space(key: str) -> Response:
         """
@@ -113,3 +124,14 @@ class Spaces:
             "/rest/api/space/" + key,
             f"Deleting space with key {key} in Confluence...",
         )
+
+    @staticmethod
+    def get_long_task(task_id: str) -> Response:
+        """
+        Gets the status of a long running task, such as the one started by delete_space()
+        https://developer.atlassian.com/cloud/confluence/rest/v1/api-group-long-running-task/#api-wiki-rest-api-longtask-id-get
+        """
+        return http.get(
+            f"/rest/api/longtask/{task_id}",
+            f"Getting the status of long task {task_id} in Confluence..."
+        )
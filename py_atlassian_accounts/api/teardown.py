@@ -0,0 +1,293 @@
+from api.bulk import BULK_WORKERS
+from api.projects import Projects
+from api.spaces import Spaces
+import constants
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from requests import Response
+from typing import Callable, Iterable
+import logging
+import time
+
+# The most deletion tasks left running on the servers at once. Further deletions
+# are only started as earlier ones finish.
+# Can be overridden by defining TEARDOWN_MAX_TASKS in constants.py
+TEARDOWN_MAX_TASKS = getattr(constants, "TEARDOWN_MAX_TASKS", 20)
+
+# Bounds, in seconds, of the interval between two polls of the same task. The
+# interval grows by POLL_BACKOFF each time a task has made no progress since
+# its last poll
+POLL_INITIAL = getattr(constants, "POLL_INITIAL", 0.5)
+POLL_MAX = getattr(constants, "POLL_MAX", 10.0)
+POLL_BACKOFF = 1.5
+
+# Polls of one task that may fail in a row before it is given up on
+POLL_MAX_ERRORS = 5
+
+# Statuses of a Jira task that has stopped running
+# https://developer.atlassian.com/cloud/jira/platform/rest/v3/api-group-tasks/#api-rest-api-3-task-taskid-get
+JIRA_FINISHED_STATUSES = ("COMPLETE", "FAILED", "CANCELLED", "DEAD")
+
+SPACE = "space"
+PROJECT = "project"
+
+logger = logging.getLogger(__name__)
+
+
+class TeardownResult:
+    """
+    The outcome of deleting one space or project
+        kind - SPACE or PROJECT
+        key - The space or project key
+        task_id - The ID of the server's deletion task, or None if the deletion
+            finished (or failed) without one
+        ok - True once the deletion has succeeded
+        error - Why the deletion failed, if it did
+        elapsed - Seconds from sending the deletion to seeing it finish
+    """
+
+    __slots__ = ("kind", "key", "task_id", "ok", "error", "elapsed",
+                 "started", "progress", "interval", "next_poll", "poll_errors")
+
+    def __init__(self, kind: str, key: str):
+        self.kind = kind
+        self.key = key
+        self.task_id: str | None = None
+        self.ok = False
+        self.error: str | None = None
+        self.elapsed = 0.0
+
+        # Polling state while the task runs
+        self.started = time.monotonic()
+        self.progress = 0
+        self.interval = POLL_INITIAL
+        self.next_poll = 0.0
+        self.poll_errors = 0
+
+    def _finish(self, ok: bool, error: str | None = None):
+        self.ok = ok
+        self.error = error
+        self.elapsed = time.monotonic() - self.started
+
+    def __repr__(self) -> str:
+        return (f"TeardownResult({self.kind} {self.key}, task_id={self.task_id}, ok={self.ok}, "
+                f"error={self.error!r}, elapsed={self.elapsed:.1f}s)")
+
+
+class TeardownReport:
+    """
+    The results of a teardown, in the order the deletions finished
+    """
+
+    def __init__(self, results: list[TeardownResult], elapsed: float, polls: int):
+        self.results = results
+        self.elapsed = elapsed
+        self.polls = polls
+
+    @property
+    def successes(self) -> list[TeardownResult]:
+        return [result for result in self.results if result.ok]
+
+    @property
+    def failures(self) -> list[TeardownResult]:
+        return [result for result in self.results if not result.ok]
+
+    @property
+    def throughput(self) -> float:
+        """
+        Deletions completed per second
+        """
+        return len(self.successes) / self.elapsed if self.elapsed else 0.0
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    def __repr__(self) -> str:
+        return (f"TeardownReport({len(self.successes)} deleted, {len(self.failures)} failed "
+                f"in {self.elapsed:.1f}s, {self.throughput:.2f}/s, {self.polls} polls)")
+
+
+def _error(response: Response) -> str:
+    return f"HTTP {response.status_code}: {response.text[:200]}"
+
+
+def _jira_task_id(response: Response) -> str | None:
+    """
+    Jira answers an async project delete with a 303 to the task. requests follows
+    it, so the task ID is in the redirect's Location, or in the task body
+    """
+    for redirect in response.history:
+        location = redirect.headers.get("Location")
+        if location:
+            return location.rstrip("/").rsplit("/", 1)[-1]
+    location = response.headers.get("Location")
+    if location:
+        return location.rstrip("/").rsplit("/", 1)[-1]
+    try:
+        return str(response.json()["id"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class Teardown:
+    """
+    Deletes many Confluence spaces and Jira projects at once and tracks the
+    server side tasks that do the work:
+        - deletions are sent from a pool of max_workers threads, but no more than
+          max_tasks deletion tasks are left running on the servers at a time
+        - every running task is polled from the same loop on the same pool, each
+          on its own schedule. A task's poll interval starts at POLL_INITIAL and
+          backs off towards POLL_MAX while it makes no progress. Once it reports
+          progress, its next poll is timed for when it should finish at its rate
+          so far, within the same bounds
+        - on_result is called with each TeardownResult as its deletion finishes,
+          e.g. to report progress
+    """
+
+    def __init__(self, max_workers: int = BULK_WORKERS, max_tasks: int = TEARDOWN_MAX_TASKS,
+                 on_result: Callable[[TeardownResult], None] | None = None):
+        self.max_workers = max_workers
+        self.max_tasks = max_tasks
+        self.on_result = on_result
+
+    def run(self, spaces: Iterable[str] = (), projects: Iterable[str] = ()) -> TeardownReport:
+        """
+        Deletes every space and project key given and returns once all of their
+        tasks have finished
+        """
+        queue = [TeardownResult(SPACE, key) for key in spaces] + \
+                [TeardownResult(PROJECT, key) for key in projects]
+        queue.reverse()
+        started = time.monotonic()
+        results: list[TeardownResult] = []
+        running: list[TeardownResult] = []
+        futures: dict[Future, TeardownResult] = {}
+        polls = 0
+
+        def done(result: TeardownResult):
+            results.append(result)
+            if result in running:
+                running.remove(result)
+            if self.on_result is not None:
+                self.on_result(result)
+            if result.ok:
+                logger.info(f"Deleted {result.kind} {result.key} in {result.elapsed:.1f}s "
+                            f"({len(results)} done, {len(running) + len(queue)} left)")
+            else:
+                logger.error(f"Failed to delete {result.kind} {result.key}: {result.error}")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="teardown") as executor:
+            while queue or futures or running:
+                # Start further deletions while there is room for their tasks
+                while queue and len(running) < self.max_tasks:
+                    result = queue.pop()
+                    running.append(result)
+                    futures[executor.submit(self._start, result)] = result
+
+                # Poll every task that is due and not already being polled
+                now = time.monotonic()
+                polling = set(futures.values())
+                for result in running:
+                    if result.task_id is not None and result not in polling and result.next_poll <= now:
+                        futures[executor.submit(self._poll, result)] = result
+                        polls += 1
+
+                polling = set(futures.values())
+                next_due = min((r.next_poll for r in running
+                                if r.task_id is not None and r not in polling), default=None)
+                timeout = max(next_due - time.monotonic(), 0.0) if next_due is not None else None
+                if not futures:
+                    # Nothing is in flight, and wait() on no futures returns at
+                    # once, so sleep until the next task is due instead
+                    time.sleep(timeout or 0.0)
+                    continue
+                finished, _ = wait(list(futures), timeout=timeout, return_when=FIRST_COMPLETED)
+
+                for future in finished:
+                    result = futures.pop(future)
+                    try:
+                        complete = future.result()
+                    except Exception as e:
+                        if result.task_id is None:
+                            result._finish(False, f"{type(e).__name__}: {e}")
+                            complete = True
+                        else:
+                            complete = self._poll_failed(result, f"{type(e).__name__}: {e}")
+                    if complete:
+                        done(result)
+
+        return TeardownReport(results, time.monotonic() - started, polls)
+
+    @staticmethod
+    def _start(result: TeardownResult) -> bool:
+        """
+        Sends the deletion. Returns True if it is already finished, i.e. it failed
+        or the server deleted without a task
+        """
+        result.started = time.monotonic()
+        if result.kind == SPACE:
+            response = Spaces.delete_space(result.key)
+            task_id = response.json().get("id") if response.status_code == 202 else None
+        else:
+            response = Projects.delete_project_async(result.key)
+            task_id = _jira_task_id(response) if response.ok else None
+
+        if not response.ok:
+            result._finish(False, _error(response))
+            return True
+        if task_id is None:
+            result._finish(True)
+            return True
+        result.task_id = str(task_id)
+        result.next_poll = time.monotonic() + POLL_INITIAL
+        return False
+
+    @staticmethod
+    def _poll(result: TeardownResult) -> bool:
+        """
+        Polls a task once and schedules its next poll. Returns True once it has finished
+        """
+        if result.kind == SPACE:
+            response = Spaces.get_long_task(result.task_id)
+        else:
+            response = Projects.get_task(result.task_id)
+        if not response.ok:
+            return Teardown._poll_failed(result, _error(response))
+        task = response.json()
+        result.poll_errors = 0
+
+        if result.kind == SPACE:
+            progress = task.get("percentageComplete", 0)
+            if task.get("finished"):
+                messages = "; ".join(m.get("translation", "") for m in task.get("messages", []))
+                result._finish(bool(task.get("successful")), None if task.get("successful") else
+                               messages or "The long task was unsuccessful")
+                return True
+        else:
+            progress = task.get("progress", 0)
+            status = task.get("status")
+            if status in JIRA_FINISHED_STATUSES:
+                result._finish(status == "COMPLETE", None if status == "COMPLETE" else
+                               task.get("message") or f"Task ended with status {status}")
+                return True
+
+        now = time.monotonic()
+        if progress > result.progress:
+            # Poll again around when the task should finish at its rate so far
+            rate = progress / (now - result.started)
+            result.interval = min(max((100 - progress) / rate, POLL_INITIAL), POLL_MAX)
+        else:
+            result.interval = min(result.interval * POLL_BACKOFF, POLL_MAX)
+        result.progress = progress
+        result.next_poll = now + result.interval
+        return False
+
+    @staticmethod
+    def _poll_failed(result: TeardownResult, error: str) -> bool:
+        result.poll_errors += 1
+        if result.poll_errors >= POLL_MAX_ERRORS:
+            result._finish(False, f"Gave up polling task {result.task_id}: {error}")
+            return True
+        result.interval = min(result.interval * POLL_BACKOFF, POLL_MAX)
+        result.next_poll = time.monotonic() + result.interval
+        return False
@@ -0,0 +1,232 @@
+from api.bulk import BULK_WORKERS
+from api.http import Http
+from api.pagination import iter_jira
+from api.space_permissions import USER_PERMISSIONS, SpacePermissions
+import constants
+
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from requests import Response
+from typing import Iterable, Iterator
+import logging
+import re
+import threading
+import time
+
+# How long, in seconds, a found account ID and a failed lookup are remembered.
+# Can be overridden by defining RESOLVER_TTL and RESOLVER_NEGATIVE_TTL in constants.py
+RESOLVER_TTL = getattr(constants, "RESOLVER_TTL", 24 * 3600)
+RESOLVER_NEGATIVE_TTL = getattr(constants, "RESOLVER_NEGATIVE_TTL", 3600)
+
+# Account IDs checked per /user/bulk request. Each is sent as its own query
+# parameter, so this also bounds the length of the url
+USER_BULK_BATCH = getattr(constants, "USER_BULK_BATCH", 50)
+
+# Turns a student number into an email address to search for, e.g.
+# "{}@student.scu.edu.au". Without it, student numbers are searched for as they are.
+# Can be overridden by defining STUDENT_EMAIL_FORMAT in constants.py
+STUDENT_EMAIL_FORMAT = getattr(constants, "STUDENT_EMAIL_FORMAT", None)
+
+# Atlassian account IDs are either 24 hex digits or "<prefix>:<uuid>"
+ACCOUNT_ID_PATTERN = re.compile(r"^([0-9a-f]{24}|[0-9a-z]+:[0-9a-f-]{36})$", re.I)
+STUDENT_NUMBER_PATTERN = re.compile(r"^[a-z]?\d{5,10}$", re.I)
+
+logger = logging.getLogger(__name__)
+
+http = Http.jira()
+
+
+class Users:
+    """
+    An object for looking up Jira users
+    """
+
+    @staticmethod
+    def iter_users_bulk(account_ids: list[str]) -> Iterator[dict]:
+        """
+        Yields the users with the given account IDs. IDs with no user are left out
+        https://developer.atlassian.com/cloud/jira/platform/rest/v3/api-group-users/#api-rest-api-3-user-bulk-get
+        """
+        return iter_jira(
+            "/rest/api/3/user/bulk",
+            f"Getting {len(account_ids)} users by account ID in Jira.",
+            {"accountId": account_ids},
+            page_size=len(account_ids),
+            client=http
+        )
+
+    @staticmethod
+    def search_users(query: str, max_results: int = 50) -> Response:
+        """
+        Finds users whose display name or email address starts with query
+        https://developer.atlassian.com/cloud/jira/platform/rest/v3/api-group-user-search/#api-rest-api-3-user-search-get
+        """
+        return http.add_queries({
+            "query": query,
+            "maxResults": max_results,
+        }).get(
+            "/rest/api/3/user/search",
+            f"Searching for users matching {query} in Jira."
+        )
+
+
+def _matches(user: dict, query: str) -> bool:
+    """
+    Whether a user found by searching for query is exactly that user: an email
+    must be their email address, and anything else their username or the part
+    of their email address before the @
+    """
+    email = (user.get("emailAddress") or "").lower()
+    if "@" in query:
+        return email == query
+    return query in (email.partition("@")[0] if email else None, (user.get("name") or "").lower())
+
+
+def _batches(items: list, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class AccountResolver:
+    """
+    Turns the user identifiers found in rosters into Atlassian account IDs:
+        - account IDs are checked in batches of USER_BULK_BATCH through /user/bulk
+        - email addresses are searched for through /user/search, and must match
+          one user's email exactly
+        - student numbers are searched for as the email STUDENT_EMAIL_FORMAT makes
+          of them, or as they are if it is not set. Either way they must match
+          exactly one user's email, or, searched for as they are, one user's
+          username or the part of their email before the @
+
+    Identifiers are normalised and deduplicated before any lookup, and the lookups
+    are run on max_workers threads. Found account IDs are cached for ttl seconds,
+    and identifiers that matched no single user for negative_ttl seconds
+    """
+
+    def __init__(self, max_workers: int = BULK_WORKERS, ttl: float = RESOLVER_TTL,
+                 negative_ttl: float = RESOLVER_NEGATIVE_TTL):
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # normalised identifier -> (account ID or None, expiry time)
+        self.cache: dict[str, tuple[str | None, float]] = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def normalise(identifier: str) -> str:
+        identifier = identifier.strip()
+        return identifier if ACCOUNT_ID_PATTERN.match(identifier) else identifier.lower()
+
+    def _cached(self, identifier: str) -> tuple[bool, str | None]:
+        with self.lock:
+            entry = self.cache.get(identifier)
+        if entry is None or entry[1] < time.monotonic():
+            return False, None
+        return True, entry[0]
+
+    def _store(self, identifier: str, account_id: str | None):
+        ttl = self.ttl if account_id is not None else self.negative_ttl
+        with self.lock:
+            self.cache[identifier] = (account_id, time.monotonic() + ttl)
+
+    def invalidate(self, identifier: str | None = None):
+        """
+        Forgets one identifier, or everything
+        """
+        with self.lock:
+            if identifier is None:
+                self.cache.clear()
+            else:
+                self.cache.pop(self.normalise(identifier), None)
+
+    def resolve(self, identifiers: Iterable[str]) -> dict[str, str | None]:
+        """
+        Returns a map of each identifier given to its account ID, or to None if it
+        matched no single user or its lookup failed
+        """
+        identifiers = list(identifiers)
+        normalised = {identifier: self.normalise(identifier) for identifier in identifiers}
+
+        account_ids, searches = [], []
+        for identifier in dict.fromkeys(normalised.values()):
+            if self._cached(identifier)[0]:
+                continue
+            (account_ids if ACCOUNT_ID_PATTERN.match(identifier) else searches).append(identifier)
+
+        if account_ids or searches:
+            logger.info(f"Resolving {len(account_ids)} account IDs and {len(searches)} "
+                        f"emails or student numbers...")
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="resolver") as executor:
+                jobs = [executor.submit(self._check_batch, batch)
+                        for batch in _batches(account_ids, USER_BULK_BATCH)]
+                jobs += [executor.submit(self._search, identifier) for identifier in searches]
+                for job in jobs:
+                    try:
+                        job.result()
+                    except Exception as e:
+                        # Left uncached, so the identifiers are looked up again next time
+                        logger.error(f"User lookup failed: {type(e).__name__}: {e}")
+
+        return {identifier: self._cached(normalised[identifier])[1] for identifier in identifiers}
+
+    def resolve_one(self, identifier: str) -> str | None:
+        return self.resolve([identifier])[identifier]
+
+    def __getitem__(self, identifier: str) -> str:
+        account_id = self.resolve_one(identifier)
+        if account_id is None:
+            raise KeyError(f"No single Atlassian user matches {identifier!r}")
+        return account_id
+
+    def _check_batch(self, account_ids: list[str]):
+        found = {user["accountId"] for user in Users.iter_users_bulk(account_ids)}
+        for account_id in account_ids:
+            self._store(account_id, account_id if account_id in found else None)
+
+    def _search(self, identifier: str):
+        query = identifier
+        if "@" not in identifier and STUDENT_NUMBER_PATTERN.match(identifier) and STUDENT_EMAIL_FORMAT:
+            query = STUDENT_EMAIL_FORMAT.format(identifier).lower()
+
+        response = Users.search_users(query)
+        response.raise_for_status()
+        # The search matches prefixes of names as well as emails, so only exact
+        # matches count
+        users = [user for user in response.json() if _matches(user, query)]
+        if len(users) == 1:
+            self._store(identifier, users[0]["accountId"])
+            return
+        if len(users) > 1:
+            logger.warning(f"{identifier} matches {len(users)} users, not resolving it")
+        self._store(identifier, None)
+
+    def resolve_pairs(self, pairs: Iterable[tuple[str, str]]) -> tuple[list[tuple[str, str]], list[str]]:
+        """
+        Resolves the second item of each (groupId, identifier) pair, ready for
+        Groups.add_user_to_group or Groups.bulk_add_users_to_groups. Returns the
+        resolved pairs and the identifiers that could not be resolved
+        """
+        pairs = list(pairs)
+        account_ids = self.resolve(identifier for _, identifier in pairs)
+        resolved = [(group, account_ids[identifier]) for group, identifier in pairs
+                    if account_ids[identifier] is not None]
+        unresolved = list(dict.fromkeys(identifier for _, identifier in pairs
+                                        if account_ids[identifier] is None))
+        return resolved, unresolved
+
+    def space_permissions(self, identifiers: Iterable[str], perms: list[tuple[str, str]] = USER_PERMISSIONS,
+                          size: int = 1) -> tuple[list[SpacePermissions], list[str]]:
+        """
+        Builds a SpacePermissions for every identifier that resolves to a user, to be
+        added to a Spaces object. Returns them with the identifiers that could not
+        be resolved
+        """
+        account_ids = self.resolve(identifiers)
+        permissions = [SpacePermissions("user", account_id, size, perms)
+                       for account_id in dict.fromkeys(a for a in account_ids.values() if a is not None)]
+        return permissions, [identifier for identifier, a in account_ids.items() if a is None]
+
+
+# The resolver shared by the rest of the library, so its cache is too
+resolver = AccountResolver()
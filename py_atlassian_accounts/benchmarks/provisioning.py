@@ -0,0 +1,322 @@
+"""
+Throughput and latency benchmarks for realistic provisioning workloads.
+
+Every request is answered in-process by the fake_server routes through a stub
+requests transport, so results measure this library's own overhead (plus any
+--latency added per request) without a network. Run from the parent directory:
+    python -m benchmarks.provisioning --sizes 1000 10000 50000
+    python -m benchmarks.provisioning --compare benchmarks/results/<earlier>.json
+
+Each scenario runs in its own process so peak RSS is measured per scenario.
+Results are written to benchmarks/results/<timestamp>.json
+"""
+import os
+
+# Route the api module at the stub transport. These must be set before the api
+# modules are imported, as they build their module level clients on import
+STUB_URL = "http://stub.atlassian.local"
+os.environ["JIRA_BASE_URL"] = STUB_URL
+os.environ["CONFLUENCE_BASE_URL"] = STUB_URL
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import wraps
+from requests import PreparedRequest, Response
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+import argparse
+import json
+import logging
+import platform
+import resource
+import statistics
+import subprocess
+import threading
+import time
+
+import fake_server
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Scenario results slower than this fraction of the baseline are flagged by --compare
+REGRESSION_THRESHOLD = 0.10
+
+
+class StubAdapter(BaseAdapter):
+    """
+    A requests transport that answers every request from a FakeAtlassian state
+    in-process instead of opening a connection
+    """
+
+    def __init__(self, state: fake_server.FakeAtlassian):
+        super().__init__()
+        self.state = state
+
+    def send(self, request: PreparedRequest, **kwargs) -> Response:
+        path = request.path_url
+        body = request.body.encode() if isinstance(request.body, str) else (request.body or b"")
+        status, data, headers = fake_server.dispatch(self.state, request.method, path, body)
+
+        response = Response()
+        response.status_code = status
+        response._content = data
+        response._content_consumed = True
+        response.headers = CaseInsensitiveDict({"Content-Type": "application/json", **headers})
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class CpuTimer:
+    """
+    Accumulates the thread CPU time spent inside wrapped functions, by category
+    """
+
+    def __init__(self):
+        self.totals: dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def wrap(self, owner, name: str, category: str):
+        func = getattr(owner, name)
+
+        @wraps(func)
+        def timed(*args, **kwargs):
+            start = time.thread_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.thread_time() - start
+                with self.lock:
+                    self.totals[category] = self.totals.get(category, 0.0) + elapsed
+
+        setattr(owner, name, timed)
+
+
+def _setup(latency: float, log_level: str) -> tuple[fake_server.FakeAtlassian, CpuTimer]:
+    """
+    Installs the stub transport, lifts the client rate limit (the stub never
+    throttles) and instruments the payload and log formatting code
+    """
+    from api.http import Http, _LazyBody, configure_logging
+    from api import serialization
+    from api.rate_limit import RateLimiter
+    from api.space_permissions import SpacePermissions
+    from api.permission_schemes import PermissionSchemes
+    from api.spaces import Spaces
+
+    configure_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        # Keep the queued file handler, but don't flood the terminal
+        if isinstance(handler, logging.StreamHandler) and not isinstance(handler, logging.FileHandler):
+            root.removeHandler(handler)
+    root.setLevel(log_level)
+
+    state = fake_server.FakeAtlassian(latency=latency)
+    Http.session_for(STUB_URL).mount(STUB_URL, StubAdapter(state))
+    limiter = RateLimiter.for_site(STUB_URL)
+    limiter.max_rate = float("inf")
+    limiter.bucket.set_rate(float("inf"))
+
+    timer = CpuTimer()
+    timer.wrap(logging.Logger, "_log", "logging")
+    timer.wrap(_LazyBody, "__str__", "log_body_formatting")
+    timer.wrap(SpacePermissions, "permissions_list", "payload_building")
+    timer.wrap(PermissionSchemes, "payload", "payload_building")
+    timer.wrap(Spaces, "payload", "payload_building")
+    timer.wrap(serialization, "dumps", "serialization")
+    timer.wrap(serialization, "loads", "serialization")
+    return state, timer
+
+
+def _timed(latencies: list[float], func):
+    @wraps(func)
+    def call(*args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            latencies.append(time.perf_counter() - start)
+    return call
+
+
+def onboarding(size: int, workers: int, latencies: list[float]) -> int:
+    """
+    Onboards a cohort of size students: one group per 250 students, every
+    student added to their group, and every student given the Student role in
+    their course project through the role batcher
+    """
+    from api.bulk import run_bulk
+    from api.groups import Groups
+    from api.projects import Projects
+    from api.role_batcher import RoleActorBatcher
+
+    courses = max(1, size // 250)
+    group_ids = [Groups.create_group(f"COURSE{c} Students").json()["groupId"] for c in range(courses)]
+    for c in range(courses):
+        Projects.create_scrum_project(f"Course {c}", f"C{c}")
+    role_id = str(Projects.create_project_role("Student", "Students").json()["id"])
+
+    pairs = [(group_ids[i % courses], f"student-{i}") for i in range(size)]
+    report = run_bulk(_timed(latencies, Groups.add_user_to_group), pairs, workers)
+
+    batcher = RoleActorBatcher()
+    batcher._post = _timed(latencies, batcher._post)
+    with batcher:
+        for i in range(size):
+            batcher.add_user(f"C{i % courses}", role_id, f"student-{i}")
+    return len(report) + batcher.requests_sent
+
+
+def space_creation(size: int, workers: int, latencies: list[float]) -> int:
+    """
+    Creates size / 50 spaces, each with 50 permission subjects: one admin group,
+    one user group and 48 individual users
+    """
+    from api.bulk import run_bulk
+    from api.spaces import Spaces
+
+    def create(index: int):
+        space = Spaces(f"Space {index}", f"SP{index}", "Benchmark space")
+        space.add_admin_permissions("group", f"tutors-{index}", 1)
+        space.add_user_permissions("group", f"students-{index}", 1)
+        for user in range(48):
+            space.add_user_permissions("user", f"user-{index}-{user}", 1)
+        return space.create_space()
+
+    spaces = max(1, size // 50)
+    return len(run_bulk(_timed(latencies, create), [(i,) for i in range(spaces)], workers))
+
+
+def teardown(size: int, workers: int, latencies: list[float]) -> int:
+    """
+    Creates size / 50 groups, projects and spaces untimed, then deletes them all
+    """
+    from api.bulk import run_bulk
+    from api.groups import Groups
+    from api.projects import Projects
+    from api.spaces import Spaces
+
+    count = max(1, size // 50)
+    for i in range(count):
+        Groups.create_group(f"TEARDOWN{i}")
+        Projects.create_scrum_project(f"Teardown {i}", f"T{i}")
+        Spaces(f"Teardown {i}", f"TD{i}", "").create_space()
+    latencies.clear()
+
+    items = [(i,) for i in range(count)]
+    sent = len(run_bulk(_timed(latencies, lambda i: Groups.delete_group(f"TEARDOWN{i}")), items, workers))
+    sent += len(run_bulk(_timed(latencies, lambda i: Projects.delete_project(f"T{i}")), items, workers))
+    sent += len(run_bulk(_timed(latencies, lambda i: Spaces.delete_space(f"TD{i}")), items, workers))
+    return sent
+
+
+SCENARIOS = {
+    "onboarding": onboarding,
+    "space_creation": space_creation,
+    "teardown": teardown,
+}
+
+
+def run_scenario(name: str, size: int, workers: int, latency: float, log_level: str) -> dict:
+    """
+    Runs one scenario in the current process and returns its measurements
+    """
+    state, timer = _setup(latency, log_level)
+    latencies: list[float] = []
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    requests_sent = SCENARIOS[name](size, workers, latencies)
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+    percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0.0] * 99
+    return {
+        "scenario": name,
+        "size": size,
+        "workers": workers,
+        "timed_calls": len(latencies),
+        "requests": state.stats()["requests"],
+        "wall_seconds": wall,
+        "requests_per_second": requests_sent / wall if wall else 0.0,
+        "latency_ms": {
+            "p50": percentiles[49] * 1000,
+            "p95": percentiles[94] * 1000,
+            "p99": percentiles[98] * 1000,
+        },
+        "cpu_seconds": cpu,
+        "cpu_seconds_by_category": timer.totals,
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                       / (1024 * 1024 if platform.system() == "Darwin" else 1024),
+    }
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline_path: str, results: list[dict]) -> list[str]:
+    """
+    Compares results with an earlier results file and returns a line per
+    scenario, marking throughput drops beyond REGRESSION_THRESHOLD
+    """
+    with open(baseline_path) as f:
+        baseline = {(r["scenario"], r["size"]): r for r in json.load(f)["results"]}
+    lines = []
+    for result in results:
+        before = baseline.get((result["scenario"], result["size"]))
+        if before is None or not before["requests_per_second"]:
+            continue
+        change = result["requests_per_second"] / before["requests_per_second"] - 1
+        flag = "  REGRESSION" if change < -REGRESSION_THRESHOLD else ""
+        lines.append(f"{result['scenario']:>15} {result['size']:>6}: "
+                     f"{before['requests_per_second']:9.1f} -> {result['requests_per_second']:9.1f} req/s "
+                     f"({change:+.1%}){flag}")
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Provisioning throughput and latency benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000],
+                        help="Cohort sizes to run every scenario at")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--workers", type=int, default=10, help="Concurrent requests")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds of latency per stub request")
+    parser.add_argument("--log-level", default="INFO", help="Root log level while benchmarking")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="An earlier results file to compare against")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        for name in args.scenarios:
+            # A fresh process per scenario keeps peak RSS and module state separate
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                result = executor.submit(run_scenario, name, size, args.workers,
+                                         args.latency, args.log_level).result()
+            results.append(result)
+            print(f"{name:>15} {size:>6}: {result['requests_per_second']:9.1f} req/s, "
+                  f"p50 {result['latency_ms']['p50']:.2f}ms p95 {result['latency_ms']['p95']:.2f}ms "
+                  f"p99 {result['latency_ms']['p99']:.2f}ms, peak RSS {result['peak_rss_mb']:.0f}MB, "
+                  f"CPU {result['cpu_seconds_by_category']}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(output, "w") as f:
+        json.dump({
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "settings": {"workers": args.workers, "latency": args.latency, "log_level": args.log_level},
+            "results": results,
+        }, f, indent=4)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        print("\n".join(compare(args.compare, results)))
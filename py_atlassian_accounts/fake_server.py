@@ -0,0 +1,518 @@
+"""
+A local stand-in for the Jira and Confluence endpoints used by the api module,
+for load testing bulk runs without touching a real site.
+
+Run it from this directory:
+    python fake_server.py --port 8080 --latency 0.05 --error-rate 0.01 --rate-limit 100
+
+and point the api module at it before running a job:
+    JIRA_BASE_URL=http://127.0.0.1:8080 CONFLUENCE_BASE_URL=http://127.0.0.1:8080 python main.py ...
+
+State is kept in memory and lost when the server stops. Authentication is not checked.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+
+
+class FakeAtlassian:
+    """
+    In-memory state of a fake Jira and Confluence site, and the chaos settings
+    applied to every request:
+        latency - Seconds added to every response
+        jitter - Up to this many further seconds, chosen at random per request
+        error_rate - The fraction of requests that fail with a 500
+        rate_limit - Requests per second allowed before responding 429 with
+            Retry-After, or None for no limit
+        task_duration - Seconds a space or project deletion task takes to finish
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 rate_limit: float | None = None, task_duration: float = 0.5):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.task_duration = task_duration
+
+        self.lock = threading.Lock()
+        self.ids = itertools.count(10000)
+        self.groups: dict[str, dict] = {}              # groupId -> {"name", "members": set}
+        self.projects: dict[str, dict] = {}            # key -> project json
+        self.roles: dict[str, dict] = {}               # role id -> role json
+        self.role_actors: dict[tuple[str, str], set] = {}  # (project key, role id) -> {(type, id)}
+        self.schemes: dict[str, dict] = {}             # scheme id -> scheme json
+        self.spaces: dict[str, dict] = {}              # key -> space json
+        self.tasks: dict[str, dict] = {}               # long task id -> {"id", "started_at"}
+        self.users: dict[str, dict] = {}               # accountId -> user json
+
+        self.requests = 0
+        self.throttled = 0
+        self.failed = 0
+        self._tokens = rate_limit or 0.0
+        self._token_time = time.monotonic()
+
+    def next_id(self) -> str:
+        return str(next(self.ids))
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"requests": self.requests, "throttled": self.throttled, "failed": self.failed}
+
+    def admit(self) -> int | None:
+        """
+        Applies latency, throttling and random errors to one request. Returns the
+        status code to fail it with, or None to carry on
+        """
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+        with self.lock:
+            self.requests += 1
+            if self.rate_limit:
+                now = time.monotonic()
+                self._tokens = min(self.rate_limit,
+                                   self._tokens + (now - self._token_time) * self.rate_limit)
+                self._token_time = now
+                if self._tokens < 1:
+                    self.throttled += 1
+                    return 429
+                self._tokens -= 1
+            if random.random() < self.error_rate:
+                self.failed += 1
+                return 500
+        return None
+
+    def start_task(self) -> str:
+        task_id = self.next_id()
+        self.tasks[task_id] = {"id": task_id, "started_at": time.monotonic()}
+        return task_id
+
+    def task_progress(self, task_id: str) -> int | None:
+        """
+        The percentage complete of a deletion task, or None if there is no such task
+        """
+        task = self.tasks.get(task_id)
+        if task is None:
+            return None
+        if not self.task_duration:
+            return 100
+        return min(100, int((time.monotonic() - task["started_at"]) / self.task_duration * 100))
+
+    def seed_users(self, count: int, domain: str = "student.example.edu"):
+        """
+        Adds count users with 24 hex digit account IDs and emails made from
+        seven digit student numbers, e.g. s1000042@student.example.edu
+        """
+        for i in range(count):
+            account_id = f"{i:024x}"
+            self.users[account_id] = {"accountId": account_id, "accountType": "atlassian",
+                                      "emailAddress": f"s{1000000 + i}@{domain}",
+                                      "displayName": f"Student {1000000 + i}", "active": True}
+
+    def group_by_name(self, name: str) -> tuple[str, dict] | None:
+        for group_id, group in self.groups.items():
+            if group["name"].casefold() == name.casefold():
+                return group_id, group
+        return None
+
+
+def _page(values: list, query: dict) -> dict:
+    """
+    A Jira startAt/maxResults page
+    """
+    start_at, max_results = int(query.get("startAt", 0)), int(query.get("maxResults", 50))
+    page = values[start_at:start_at + max_results]
+    return {"startAt": start_at, "maxResults": max_results, "total": len(values),
+            "isLast": start_at + max_results >= len(values), "values": page}
+
+
+def _confluence_page(path: str, results: list, query: dict) -> dict:
+    """
+    A Confluence start/limit page with a _links.next link while more results remain
+    """
+    start, limit = int(query.get("start", 0)), int(query.get("limit", 25))
+    page = {"start": start, "limit": limit, "size": len(results[start:start + limit]),
+            "results": results[start:start + limit], "_links": {}}
+    if start + limit < len(results):
+        page["_links"]["next"] = f"{path}?start={start + limit}&limit={limit}"
+    return page
+
+
+# Each route is (method, path pattern, handler name). Handlers take the state,
+# the path match, the query dict and the decoded body, and return (status, body)
+ROUTES = [
+    ("GET", r"/rest/api/3/group", "get_group"),
+    ("POST", r"/rest/api/3/group", "create_group"),
+    ("DELETE", r"/rest/api/3/group", "delete_group"),
+    ("GET", r"/rest/api/3/group/bulk", "list_groups"),
+    ("GET", r"/rest/api/3/group/member", "list_group_members"),
+    ("GET", r"/rest/api/3/user/bulk", "bulk_users"),
+    ("GET", r"/rest/api/3/user/search", "search_users"),
+    ("POST", r"/rest/api/3/group/user", "add_user_to_group"),
+    ("DELETE", r"/rest/api/3/group/user", "remove_user_from_group"),
+    ("POST", r"/rest/api/3/project", "create_project"),
+    ("GET", r"/rest/api/3/project/search", "list_projects"),
+    ("GET", r"/rest/api/3/project/(?P<key>[^/]+)", "get_project"),
+    ("DELETE", r"/rest/api/3/project/(?P<key>[^/]+)", "delete_project"),
+    ("POST", r"/rest/api/3/project/(?P<key>[^/]+)/delete", "delete_project_async"),
+    ("GET", r"/rest/api/3/task/(?P<task>[^/]+)", "get_task"),
+    ("PUT", r"/rest/api/3/project/(?P<key>[^/]+)/permissionscheme", "assign_permission_scheme"),
+    ("GET", r"/rest/api/3/project/(?P<key>[^/]+)/role/(?P<role>[^/]+)", "get_role_actors"),
+    ("POST", r"/rest/api/3/project/(?P<key>[^/]+)/role/(?P<role>[^/]+)", "add_role_actors"),
+    ("DELETE", r"/rest/api/3/project/(?P<key>[^/]+)/role/(?P<role>[^/]+)", "delete_role_actor"),
+    ("GET", r"/rest/api/3/role", "list_roles"),
+    ("POST", r"/rest/api/3/role", "create_role"),
+    ("DELETE", r"/rest/api/3/role/(?P<role>[^/]+)", "delete_role"),
+    ("GET", r"/rest/api/3/permissionscheme", "list_schemes"),
+    ("POST", r"/rest/api/3/permissionscheme", "create_scheme"),
+    ("DELETE", r"/rest/api/3/permissionscheme/(?P<scheme>[^/]+)", "delete_scheme"),
+    ("GET", r"/rest/api/space", "list_spaces"),
+    ("POST", r"/rest/api/space", "create_space"),
+    ("DELETE", r"/rest/api/space/(?P<key>[^/]+)", "delete_space"),
+    ("GET", r"/rest/api/longtask/(?P<task>[^/]+)", "get_long_task"),
+]
+ROUTES = [(method, re.compile(f"^{pattern}$"), name) for method, pattern, name in ROUTES]
+
+
+class Handlers:
+    """
+    The fake endpoint implementations. All are called with state.lock held
+    """
+
+    @staticmethod
+    def get_group(state: FakeAtlassian, match, query, body):
+        found = state.group_by_name(query.get("groupname", ""))
+        if found is None:
+            return 404, {"errorMessages": ["Group not found"]}
+        group_id, group = found
+        return 200, {"name": group["name"], "groupId": group_id}
+
+    @staticmethod
+    def create_group(state: FakeAtlassian, match, query, body):
+        name = (body or {}).get("name")
+        if not name:
+            return 400, {"errorMessages": ["name is required"]}
+        if state.group_by_name(name):
+            return 400, {"errorMessages": [f"Group {name} already exists"]}
+        group_id = state.next_id()
+        state.groups[group_id] = {"name": name, "members": set()}
+        return 201, {"name": name, "groupId": group_id}
+
+    @staticmethod
+    def delete_group(state: FakeAtlassian, match, query, body):
+        found = state.group_by_name(query.get("groupname", ""))
+        if found is None:
+            return 404, {"errorMessages": ["Group not found"]}
+        del state.groups[found[0]]
+        return 200, None
+
+    @staticmethod
+    def list_groups(state: FakeAtlassian, match, query, body):
+        return 200, _page([{"name": group["name"], "groupId": group_id}
+                           for group_id, group in state.groups.items()], query)
+
+    @staticmethod
+    def list_group_members(state: FakeAtlassian, match, query, body):
+        group = state.groups.get(query.get("groupId"))
+        if group is None:
+            return 404, {"errorMessages": ["Group not found"]}
+        return 200, _page([{"accountId": account_id} for account_id in sorted(group["members"])], query)
+
+    @staticmethod
+    def add_user_to_group(state: FakeAtlassian, match, query, body):
+        group = state.groups.get(query.get("groupId"))
+        if group is None:
+            return 404, {"errorMessages": ["Group not found"]}
+        account_id = (body or {}).get("accountId")
+        if account_id in group["members"]:
+            return 400, {"errorMessages": ["User is already a member of the group"]}
+        group["members"].add(account_id)
+        return 201, {"name": group["name"], "groupId": query["groupId"]}
+
+    @staticmethod
+    def remove_user_from_group(state: FakeAtlassian, match, query, body):
+        group = state.groups.get(query.get("groupId"))
+        if group is None or query.get("accountId") not in group["members"]:
+            return 404, {"errorMessages": ["User or group not found"]}
+        group["members"].discard(query["accountId"])
+        return 200, None
+
+    @staticmethod
+    def bulk_users(state: FakeAtlassian, match, query, body):
+        account_ids = query.get("accountId", [])
+        if isinstance(account_ids, str):
+            account_ids = [account_ids]
+        users = [state.users[account_id] for account_id in account_ids if account_id in state.users]
+        return 200, _page(users, query)
+
+    @staticmethod
+    def search_users(state: FakeAtlassian, match, query, body):
+        # Jira matches the query against the start of the display name or email
+        text = query.get("query", "").casefold()
+        if not text:
+            return 400, {"errorMessages": ["One of query, accountId or property is required"]}
+        matches = [user for user in state.users.values()
+                   if user["emailAddress"].casefold().startswith(text)
+                   or user["displayName"].casefold().startswith(text)]
+        start_at, max_results = int(query.get("startAt", 0)), int(query.get("maxResults", 50))
+        return 200, matches[start_at:start_at + max_results]
+
+    @staticmethod
+    def create_project(state: FakeAtlassian, match, query, body):
+        key = (body or {}).get("key", "")
+        if not key or key in state.projects:
+            return 400, {"errors": {"projectKey": "A project with that key already exists."}}
+        project_id = state.next_id()
+        state.projects[key] = {"id": project_id, "key": key, "name": body.get("name"),
+                               "self": f"/rest/api/3/project/{project_id}"}
+        return 201, state.projects[key]
+
+    @staticmethod
+    def list_projects(state: FakeAtlassian, match, query, body):
+        return 200, _page(list(state.projects.values()), query)
+
+    @staticmethod
+    def get_project(state: FakeAtlassian, match, query, body):
+        project = state.projects.get(match["key"])
+        return (200, project) if project else (404, {"errorMessages": ["No project could be found"]})
+
+    @staticmethod
+    def delete_project(state: FakeAtlassian, match, query, body):
+        if state.projects.pop(match["key"], None) is None:
+            return 404, {"errorMessages": ["No project could be found"]}
+        return 204, None
+
+    @staticmethod
+    def delete_project_async(state: FakeAtlassian, match, query, body):
+        if state.projects.pop(match["key"], None) is None:
+            return 404, {"errorMessages": ["No project could be found"]}
+        task_id = state.start_task()
+        return 303, None, {"Location": f"/rest/api/3/task/{task_id}"}
+
+    @staticmethod
+    def get_task(state: FakeAtlassian, match, query, body):
+        progress = state.task_progress(match["task"])
+        if progress is None:
+            return 404, {"errorMessages": ["No task with that ID"]}
+        return 200, {"id": match["task"], "self": f"/rest/api/3/task/{match['task']}",
+                     "status": "COMPLETE" if progress == 100 else "RUNNING", "progress": progress}
+
+    @staticmethod
+    def assign_permission_scheme(state: FakeAtlassian, match, query, body):
+        project = state.projects.get(match["key"])
+        scheme = state.schemes.get(str((body or {}).get("id")))
+        if project is None or scheme is None:
+            return 404, {"errorMessages": ["Project or permission scheme not found"]}
+        project["permissionScheme"] = scheme["id"]
+        return 200, scheme
+
+    @staticmethod
+    def _role_json(state: FakeAtlassian, project_key: str, role_id: str) -> dict:
+        actors = []
+        for actor_type, actor_id in sorted(state.role_actors.get((project_key, role_id), ())):
+            if actor_type == "user":
+                actors.append({"type": "atlassian-user-role-actor", "actorUser": {"accountId": actor_id}})
+            else:
+                actors.append({"type": "atlassian-group-role-actor", "actorGroup": {"groupId": actor_id}})
+        return {**state.roles[role_id], "actors": actors}
+
+    @staticmethod
+    def get_role_actors(state: FakeAtlassian, match, query, body):
+        if match["key"] not in state.projects or match["role"] not in state.roles:
+            return 404, {"errorMessages": ["Project or role not found"]}
+        return 200, Handlers._role_json(state, match["key"], match["role"])
+
+    @staticmethod
+    def add_role_actors(state: FakeAtlassian, match, query, body):
+        if match["key"] not in state.projects or match["role"] not in state.roles:
+            return 404, {"errorMessages": ["Project or role not found"]}
+        actors = state.role_actors.setdefault((match["key"], match["role"]), set())
+        actors.update(("user", account_id) for account_id in (body or {}).get("user", []))
+        actors.update(("group", group_id) for group_id in (body or {}).get("groupId", []))
+        return 200, Handlers._role_json(state, match["key"], match["role"])
+
+    @staticmethod
+    def delete_role_actor(state: FakeAtlassian, match, query, body):
+        actors = state.role_actors.get((match["key"], match["role"]), set())
+        actor = ("user", query["user"]) if "user" in query else ("group", query.get("groupId"))
+        if actor not in actors:
+            return 404, {"errorMessages": ["Actor not found"]}
+        actors.discard(actor)
+        return 204, None
+
+    @staticmethod
+    def list_roles(state: FakeAtlassian, match, query, body):
+        return 200, list(state.roles.values())
+
+    @staticmethod
+    def create_role(state: FakeAtlassian, match, query, body):
+        name = (body or {}).get("name")
+        if not name or any(role["name"] == name for role in state.roles.values()):
+            return 409, {"errorMessages": [f"A project role named {name} already exists."]}
+        role_id = state.next_id()
+        state.roles[role_id] = {"id": int(role_id), "name": name,
+                                "description": body.get("description", "")}
+        return 200, state.roles[role_id]
+
+    @staticmethod
+    def delete_role(state: FakeAtlassian, match, query, body):
+        if state.roles.pop(match["role"], None) is None:
+            return 404, {"errorMessages": ["Role not found"]}
+        return 204, None
+
+    @staticmethod
+    def list_schemes(state: FakeAtlassian, match, query, body):
+        expand = "permissions" in query.get("expand", "")
+        return 200, {"permissionSchemes": [
+            scheme if expand else {k: v for k, v in scheme.items() if k != "permissions"}
+            for scheme in state.schemes.values()
+        ]}
+
+    @staticmethod
+    def create_scheme(state: FakeAtlassian, match, query, body):
+        name = (body or {}).get("name")
+        if not name or any(scheme["name"] == name for scheme in state.schemes.values()):
+            return 400, {"errorMessages": [f"A permission scheme named {name} already exists."]}
+        scheme_id = state.next_id()
+        state.schemes[scheme_id] = {"id": int(scheme_id), "name": name,
+                                    "description": body.get("description", ""),
+                                    "permissions": body.get("permissions", [])}
+        return 201, state.schemes[scheme_id]
+
+    @staticmethod
+    def delete_scheme(state: FakeAtlassian, match, query, body):
+        if state.schemes.pop(match["scheme"], None) is None:
+            return 404, {"errorMessages": ["Permission scheme not found"]}
+        return 204, None
+
+    @staticmethod
+    def list_spaces(state: FakeAtlassian, match, query, body):
+        return 200, _confluence_page("/rest/api/space", list(state.spaces.values()), query)
+
+    @staticmethod
+    def create_space(state: FakeAtlassian, match, query, body):
+        key = (body or {}).get("key", "")
+        if not key or key in state.spaces:
+            return 400, {"message": f"A space with key {key} already exists"}
+        state.spaces[key] = {"id": int(state.next_id()), "key": key, "name": body.get("name"),
+                             "type": "global"}
+        return 200, state.spaces[key]
+
+    @staticmethod
+    def delete_space(state: FakeAtlassian, match, query, body):
+        if state.spaces.pop(match["key"], None) is None:
+            return 404, {"message": "No space with key"}
+        task_id = state.start_task()
+        return 202, {"id": task_id, "links": {"status": f"/rest/api/longtask/{task_id}"}}
+
+    @staticmethod
+    def get_long_task(state: FakeAtlassian, match, query, body):
+        progress = state.task_progress(match["task"])
+        if progress is None:
+            return 404, {"message": "No long task with that ID"}
+        finished = progress == 100
+        return 200, {"id": match["task"], "finished": finished, "successful": finished,
+                     "percentageComplete": progress}
+
+
+def dispatch(state: FakeAtlassian, method: str, path: str, raw: bytes) -> tuple[int, bytes, dict]:
+    """
+    Handles one request against state, after applying its latency, throttling and
+    error settings. path includes the query string. Returns the status code,
+    encoded body and any extra headers.
+    Used by the HTTP server below, and directly by in-process stub transports
+    """
+    url = urlparse(path)
+    # Parameters given more than once, like accountId on /user/bulk, become lists
+    query = {name: values if len(values) > 1 else values[0]
+             for name, values in parse_qs(url.query).items()}
+
+    failure = state.admit()
+    if failure == 429:
+        return 429, json.dumps({"message": "Rate limit exceeded"}).encode(), \
+            {"Retry-After": "1", "X-RateLimit-Remaining": "0"}
+    if failure is not None:
+        return failure, json.dumps({"message": "Injected server error"}).encode(), {}
+
+    try:
+        body = json.loads(raw) if raw else None
+    except ValueError:
+        return 400, json.dumps({"errorMessages": ["Request body is not valid JSON"]}).encode(), {}
+
+    for route_method, pattern, name in ROUTES:
+        match = pattern.match(url.path)
+        if route_method == method and match:
+            with state.lock:
+                status, response, *headers = getattr(Handlers, name)(state, match, query, body)
+            return (status, json.dumps(response).encode() if response is not None else b"",
+                    headers[0] if headers else {})
+    return 404, json.dumps({"errorMessages": [f"No fake endpoint for {method} {url.path}"]}).encode(), {}
+
+
+def make_handler(state: FakeAtlassian):
+    class RequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _handle(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            status, data, headers = dispatch(state, self.command, self.path, raw)
+
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+        def log_message(self, format, *args):
+            pass
+
+    return RequestHandler
+
+
+def serve(state: FakeAtlassian | None = None, host: str = "127.0.0.1",
+          port: int = 0) -> tuple[ThreadingHTTPServer, FakeAtlassian]:
+    """
+    Starts the fake server on a background thread and returns it with its state.
+    With port 0, a free port is chosen; read it from server.server_address
+    """
+    state = state or FakeAtlassian()
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="fake_server").start()
+    return server, state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Jira and Confluence endpoints")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many extra random seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 500")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Requests per second before 429s")
+    parser.add_argument("--task-duration", type=float, default=0.5,
+                        help="Seconds each space or project deletion task runs for")
+    parser.add_argument("--users", type=int, default=0,
+                        help="Users to create at start up, see FakeAtlassian.seed_users()")
+    args = parser.parse_args()
+
+    state = FakeAtlassian(args.latency, args.jitter, args.error_rate, args.rate_limit, args.task_duration)
+    state.seed_users(args.users)
+    server, state = serve(state, args.host, args.port)
+    print(f"Fake Atlassian server listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        while True:
+            time.sleep(10)
+            print(state.stats())
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -1,3 +1,186 @@
 import csv
+import logging
+import re
+from itertools import islice
+from typing import Callable, Iterable, Iterator
 
-# TODO Discuss CSV file formatting with client and write an implementation based on an agreed-upon format
+logger = logging.getLogger(__name__)
+
+# Accepted header names for each roster column, compared case-insensitively
+# with spaces and underscores removed
+COLUMN_ALIASES = {
+    "user": ("user", "accountid", "userid", "atlassianid", "email", "emailaddress",
+             "studentnumber", "studentid"),
+    "group": ("group", "groupid", "groupname"),
+    "project_key": ("projectkey", "project", "key"),
+    "role": ("role", "roleid", "rolename", "projectrole"),
+    "name": ("name", "projectname", "spacename"),
+    "space_key": ("spacekey",),
+    "description": ("description", "desc"),
+    "scheme": ("scheme", "schemeid", "schemename", "permissionscheme", "permissionschemeid"),
+}
+
+# Jira project keys start with an uppercase letter and are at most 10 characters
+PROJECT_KEY_PATTERN = re.compile(r"^[A-Z][A-Z0-9_]{0,9}$")
+
+
+class RosterRecord:
+    """
+    One validated roster row
+        user - The Atlassian account ID of the user, or their email address or
+            student number to be resolved with api/users.py
+        group - The group the user belongs to, or None
+        project_key - The key of the Jira project the user works in, or None
+        role - The project role the user is given in that project, or None
+    """
+
+    __slots__ = ("line", "user", "group", "project_key", "role")
+
+    def __init__(self, line: int, user: str, group: str | None = None,
+                 project_key: str | None = None, role: str | None = None):
+        self.line = line
+        self.user = user
+        self.group = group
+        self.project_key = project_key
+        self.role = role
+
+    def __repr__(self) -> str:
+        return (f"RosterRecord(line={self.line}, user={self.user!r}, group={self.group!r}, "
+                f"project_key={self.project_key!r}, role={self.role!r})")
+
+
+class RowError:
+    """
+    A roster row that failed validation, with the line it was read from
+    """
+
+    __slots__ = ("line", "row", "reason")
+
+    def __init__(self, line: int, row: dict, reason: str):
+        self.line = line
+        self.row = row
+        self.reason = reason
+
+    def __repr__(self) -> str:
+        return f"RowError(line={self.line}, reason={self.reason!r}, row={self.row!r})"
+
+
+def log_row_error(error: RowError):
+    logger.warning("Skipping roster line %s: %s", error.line, error.reason)
+
+
+def _column_map(fieldnames: list[str], fields: Iterable[str] = ("user", "group", "project_key", "role")
+                ) -> dict[str, str]:
+    """
+    Maps each record field to the header it is read from
+    """
+    normalised = {name.strip().lower().replace(" ", "").replace("_", ""): name
+                  for name in fieldnames if name}
+    columns = {}
+    for field in fields:
+        aliases = COLUMN_ALIASES.get(field, (field.replace("_", ""),))
+        for alias in aliases:
+            if alias in normalised:
+                columns[field] = normalised[alias]
+                break
+    return columns
+
+
+def _clean(value: str | None) -> str | None:
+    if value is None:
+        return None
+    value = value.strip()
+    return value or None
+
+
+def iter_roster(path: str, on_error: Callable[[RowError], None] = log_row_error,
+                encoding: str = "utf-8-sig") -> Iterator[RosterRecord]:
+    """
+    Reads a roster CSV one row at a time and yields a RosterRecord for each valid
+    row. The file is never loaded into memory as a whole, so memory use stays
+    constant however long the roster is.
+
+    The first row must be a header containing a user column and at least one of the
+    group, project key or role columns (see COLUMN_ALIASES). Rows that fail
+    validation are passed to on_error, which logs a warning by default, and
+    reading carries on with the next row
+    """
+    with open(path, newline="", encoding=encoding) as f:
+        reader = csv.DictReader(f)
+        columns = _column_map(reader.fieldnames or [])
+        if "user" not in columns:
+            raise ValueError(f"{path} has no user/accountId column in its header: {reader.fieldnames}")
+        if not columns.keys() & {"group", "project_key", "role"}:
+            raise ValueError(f"{path} has no group, project key or role column in its header: "
+                             f"{reader.fieldnames}")
+
+        for row in reader:
+            line = reader.line_num
+            values = {field: _clean(row.get(header)) for field, header in columns.items()}
+
+            if None in row:
+                on_error(RowError(line, row, "Row has more fields than the header"))
+                continue
+            if not values["user"]:
+                on_error(RowError(line, row, "Missing user"))
+                continue
+
+            project_key = values.get("project_key")
+            if project_key:
+                project_key = project_key.upper()
+                if not PROJECT_KEY_PATTERN.match(project_key):
+                    on_error(RowError(line, row, f"Invalid project key {project_key!r}"))
+                    continue
+            if values.get("role") and not project_key:
+                on_error(RowError(line, row, "Role given without a project key"))
+                continue
+
+            yield RosterRecord(line, values["user"], values.get("group"),
+                               project_key, values.get("role"))
+
+
+def chunked(records: Iterable, size: int) -> Iterator[list]:
+    """
+    Groups an iterable into lists of at most size items, consuming it lazily
+    """
+    iterator = iter(records)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def iter_roster_chunks(path: str, size: int = 500,
+                       on_error: Callable[[RowError], None] = log_row_error) -> Iterator[list[RosterRecord]]:
+    """
+    Yields the valid records of a roster in lists of at most size records, ready to
+    be passed to bulk API calls, e.g.
+        for chunk in iter_roster_chunks("roster.csv"):
+            Groups.bulk_add_users_to_groups((r.group, r.user) for r in chunk if r.group)
+    """
+    return chunked(iter_roster(path, on_error), size)
+
+
+def iter_rows(path: str, required: Iterable[str], optional: Iterable[str] = (),
+              on_error: Callable[[RowError], None] = log_row_error,
+              encoding: str = "utf-8-sig") -> Iterator[dict[str, str | None]]:
+    """
+    Reads a CSV of any other kind of entity (e.g. the projects or spaces to create)
+    one row at a time. Each row is yielded as a dict of the required and optional
+    fields, with headers matched through COLUMN_ALIASES like iter_roster(). Rows
+    missing a required value are passed to on_error and skipped
+    """
+    required, optional = tuple(required), tuple(optional)
+    with open(path, newline="", encoding=encoding) as f:
+        reader = csv.DictReader(f)
+        columns = _column_map(reader.fieldnames or [], required + optional)
+        missing = [field for field in required if field not in columns]
+        if missing:
+            raise ValueError(f"{path} has no {', '.join(missing)} column in its header: {reader.fieldnames}")
+
+        for row in reader:
+            values = {field: _clean(row.get(columns[field])) if field in columns else None
+                      for field in required + optional}
+            empty = [field for field in required if not values[field]]
+            if empty:
+                on_error(RowError(reader.line_num, row, f"Missing {', '.join(empty)}"))
+                continue
+            yield values
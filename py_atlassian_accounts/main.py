@@ -1,12 +1,396 @@
+"""
+Command line entry point for bulk provisioning. Every subcommand reads a CSV file
+and sends one API call per unique row, e.g.
+    python main.py create-groups roster.csv
+    python main.py add-members roster.csv --concurrency 20 --rate-limit 40
+    python main.py create-spaces spaces.csv --dry-run
+    python main.py create-groups roster.csv --journal logs/groups.journal
+
+Run `python main.py <subcommand> --help` for the columns each file needs
+"""
+from api.bulk import BULK_WORKERS, BulkReport, run_bulk
+from api.groups import Groups
+from api.http import Http, configure_logging, confluence_url, jira_url
+from api.journal import Journal, group_exists, project_exists
+from api.projects import Projects
+from api.rate_limit import RATE_LIMIT, RateLimiter
 from api.spaces import Spaces
+from api.teardown import TEARDOWN_MAX_TASKS, Teardown
+from api.users import ACCOUNT_ID_PATTERN, USER_BULK_BATCH, resolver
+from api import name_index
+import constants
+
+from typing import Callable, Iterable, TextIO
+import argparse
 import logging
-import logging.config
-import json
-import api.api_handler
+import os
+import re
+import sys
+import threading
+import time
+
+# The io directory shares its name with the standard library's io module, which
+# is always imported first, so csv_handler is imported from the directory itself
+sys.path.append(os.path.join(constants.ROOT_DIR, "io"))
+from csv_handler import iter_roster, iter_rows  # noqa: E402
+
+# Jira group IDs are UUIDs. Any other value in a group column is a group name
+GROUP_ID_PATTERN = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$", re.I)
+
+# How often, in seconds, the progress line is redrawn
+PROGRESS_INTERVAL = 0.5
+
+
+class PlannedCall:
+    """
+    One API call a subcommand will make, described well enough to be printed by
+    --dry-run without sending anything
+        method, endpoint - The request that will be sent
+        description - What the call does, in terms of the row it came from
+        func, args - The api function to call and its arguments
+    """
+
+    __slots__ = ("method", "endpoint", "description", "func", "args")
+
+    def __init__(self, method: str, endpoint: str, description: str,
+                 func: Callable, args: tuple):
+        self.method = method
+        self.endpoint = endpoint
+        self.description = description
+        self.func = func
+        self.args = args
+
+    def run(self):
+        return self.func(*self.args)
+
+    def journal_key(self, command: str) -> str:
+        """
+        Identifies the call in a --journal file, the same way on every run
+        """
+        return ":".join((command, *map(str, self.args)))
+
+    def already_applied(self) -> bool:
+        """
+        Whether a create left unfinished by a crashed --journal run reached the
+        server. Other calls are safe to send again, so they are never re-checked
+        """
+        check = JOURNAL_CHECKS.get(self.func)
+        return check is not None and check(*self.args)
+
+    def __str__(self) -> str:
+        return f"{self.method:<6} {self.endpoint:<45} {self.description}"
+
+
+class Progress:
+    """
+    Prints a live progress line with throughput and the estimated time remaining,
+    updated as bulk results arrive from the worker threads
+    """
+
+    def __init__(self, total: int, stream: TextIO = sys.stderr):
+        self.total = total
+        self.stream = stream
+        self.done = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self.drawn_at = 0.0
+        self.lock = threading.Lock()
+
+    def update(self, result):
+        with self.lock:
+            self.done += 1
+            if not result.ok:
+                self.failed += 1
+            now = time.monotonic()
+            if now - self.drawn_at >= PROGRESS_INTERVAL or self.done == self.total:
+                self.drawn_at = now
+                self._draw(now)
+
+    def _draw(self, now: float):
+        elapsed = now - self.started
+        rate = self.done / elapsed if elapsed else 0.0
+        eta = (self.total - self.done) / rate if rate else 0.0
+        percent = self.done / self.total if self.total else 1.0
+        self.stream.write(f"\r{self.done}/{self.total} ({percent:.0%})  {rate:.1f} calls/s  "
+                          f"ETA {_duration(eta)}  {self.failed} failed ")
+        self.stream.flush()
+
+    def finish(self):
+        elapsed = time.monotonic() - self.started
+        self.stream.write(f"\nFinished {self.done} calls in {_duration(elapsed)}, {self.failed} failed\n")
+        self.stream.flush()
+
+
+def _duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{seconds:02}"
+
+
+def _unique(values: Iterable) -> list:
+    # Preserves roster order while dropping repeated rows
+    return list(dict.fromkeys(values))
+
+
+def _group_id(group: str) -> str:
+    return group if GROUP_ID_PATTERN.match(group) else name_index.groups[group]
+
+
+def _scheme_id(scheme: str) -> str:
+    return scheme if scheme.isdigit() else name_index.permission_schemes[scheme]
+
+
+def _add_member(group: str, user: str):
+    return Groups.add_user_to_group(_group_id(group), resolver[user])
+
+
+def _remove_member(group: str, user: str):
+    return Groups.remove_user_from_group(_group_id(group), resolver[user])
+
+
+def _assign_scheme(project_key: str, scheme: str):
+    return Projects.assign_permission_scheme_to_project(project_key, _scheme_id(scheme))
+
+
+def _create_space(name: str, key: str, description: str):
+    return Spaces(name, key, description).create_space()
+
+
+def plan_create_groups(args) -> list[PlannedCall]:
+    return [PlannedCall("POST", "/rest/api/3/group", f"Create group {name}", Groups.create_group, (name,))
+            for name in _unique(row["group"] for row in iter_rows(args.file, ("group",)))]
+
+
+def plan_teardown_groups(args) -> list[PlannedCall]:
+    return [PlannedCall("DELETE", "/rest/api/3/group", f"Delete group {name}", Groups.delete_group, (name,))
+            for name in _unique(row["group"] for row in iter_rows(args.file, ("group",)))]
+
+
+def plan_add_members(args) -> list[PlannedCall]:
+    pairs = _unique((record.group, record.user) for record in iter_roster(args.file) if record.group)
+    return [PlannedCall("POST", "/rest/api/3/group/user", f"Add {user} to group {group}",
+                        _add_member, (group, user))
+            for group, user in pairs]
+
+
+def plan_remove_members(args) -> list[PlannedCall]:
+    pairs = _unique((record.group, record.user) for record in iter_roster(args.file) if record.group)
+    return [PlannedCall("DELETE", "/rest/api/3/group/user", f"Remove {user} from group {group}",
+                        _remove_member, (group, user))
+            for group, user in pairs]
+
+
+def plan_create_projects(args) -> list[PlannedCall]:
+    rows = _unique((row["name"], row["project_key"].upper())
+                   for row in iter_rows(args.file, ("name", "project_key")))
+    return [PlannedCall("POST", "/rest/api/3/project", f"Create scrum project {name} ({key})",
+                        Projects.create_scrum_project, (name, key))
+            for name, key in rows]
+
+
+def plan_create_spaces(args) -> list[PlannedCall]:
+    rows = _unique((row["name"], row["space_key"], row["description"] or "")
+                   for row in iter_rows(args.file, ("name", "space_key"), ("description",)))
+    return [PlannedCall("POST", "/rest/api/space", f"Create space {name} ({key})",
+                        _create_space, (name, key, description))
+            for name, key, description in rows]
+
+
+def plan_assign_schemes(args) -> list[PlannedCall]:
+    rows = _unique((row["project_key"].upper(), row["scheme"])
+                   for row in iter_rows(args.file, ("project_key", "scheme")))
+    return [PlannedCall("PUT", f"/rest/api/3/project/{key}/permissionscheme",
+                        f"Assign permission scheme {scheme} to project {key}",
+                        _assign_scheme, (key, scheme))
+            for key, scheme in rows]
+
+
+def plan_teardown_spaces(args) -> list[PlannedCall]:
+    return [PlannedCall("DELETE", f"/rest/api/space/{key}", f"Delete space {key}",
+                        Spaces.delete_space, (key,))
+            for key in _unique(row["space_key"] for row in iter_rows(args.file, ("space_key",)))]
+
+
+def plan_teardown_projects(args) -> list[PlannedCall]:
+    return [PlannedCall("POST", f"/rest/api/3/project/{key}/delete", f"Delete project {key}",
+                        Projects.delete_project_async, (key,))
+            for key in _unique(row["project_key"].upper() for row in iter_rows(args.file, ("project_key",)))]
+
+
+# subcommand -> (planner, help, the columns its file needs)
+COMMANDS = {
+    "create-groups": (plan_create_groups, "Create every group named in a file", "group"),
+    "teardown-groups": (plan_teardown_groups, "Delete every group named in a file", "group"),
+    "add-members": (plan_add_members, "Add each user in a roster to their group", "user, group"),
+    "remove-members": (plan_remove_members, "Remove each user in a roster from their group", "user, group"),
+    "create-projects": (plan_create_projects, "Create a scrum project for each row", "name, project key"),
+    "create-spaces": (plan_create_spaces, "Create a Confluence space for each row",
+                      "name, space key, description (optional)"),
+    "assign-schemes": (plan_assign_schemes, "Assign a permission scheme to each project",
+                       "project key, scheme (ID or name)"),
+    "teardown-spaces": (plan_teardown_spaces, "Delete every space in a file and wait for the deletions",
+                        "space key"),
+    "teardown-projects": (plan_teardown_projects, "Delete every project in a file and wait for the deletions",
+                          "project key"),
+}
+
+# Checks for the non-idempotent calls a resumed --journal run must not repeat
+JOURNAL_CHECKS = {
+    Groups.create_group: group_exists,
+    Projects.create_scrum_project: project_exists,
+}
+
+# Subcommands whose calls start server side deletion tasks, which are run
+# through api/teardown.py rather than run_bulk()
+TEARDOWN_COMMANDS = ("teardown-spaces", "teardown-projects")
+
+
+def lookups(calls: list[PlannedCall]) -> list[str]:
+    """
+    Describes the name index sweeps a run will make before its first call, which
+    --dry-run cannot count exactly without sending requests
+    """
+    notes = []
+    if any(call.func in (_add_member, _remove_member) and not GROUP_ID_PATTERN.match(call.args[0])
+           for call in calls):
+        notes.append("one paged sweep of /rest/api/3/group/bulk to look up group IDs by name")
+    users = {call.args[1] for call in calls if call.func in (_add_member, _remove_member)}
+    if users:
+        account_ids = sum(1 for user in users if ACCOUNT_ID_PATTERN.match(user))
+        if account_ids:
+            notes.append(f"{-(-account_ids // USER_BULK_BATCH)} /rest/api/3/user/bulk requests "
+                         f"to check account IDs")
+        if len(users) > account_ids:
+            notes.append(f"{len(users) - account_ids} /rest/api/3/user/search requests "
+                         f"to resolve emails and student numbers")
+    if any(call.func is _assign_scheme and not call.args[1].isdigit() for call in calls):
+        notes.append("one request to /rest/api/3/permissionscheme to look up scheme IDs by name")
+    if any(call.func in (Spaces.delete_space, Projects.delete_project_async) for call in calls):
+        notes.append("status polls of each deletion task, usually 1 to 5 per task")
+    return notes
+
+
+def dry_run(calls: list[PlannedCall], concurrency: int, rate_limit: float, out: TextIO = sys.stdout):
+    for call in calls:
+        print(call, file=out)
+    # Assumes around 250ms per call when concurrency rather than the rate limit is the bottleneck
+    estimate = len(calls) / min(rate_limit, concurrency / 0.25) if calls else 0.0
+    print(f"\n{len(calls)} requests planned", file=out)
+    for note in lookups(calls):
+        print(f"  plus {note}", file=out)
+    print(f"Estimated duration at --concurrency {concurrency} and --rate-limit {rate_limit:g}: "
+          f"{_duration(estimate)}", file=out)
+
+
+def execute(calls: list[PlannedCall], concurrency: int, command: str = "",
+            journal: Journal | None = None) -> BulkReport:
+    """
+    Runs the calls on a thread pool. With a journal, calls it records as done by
+    an earlier run are skipped, see api/journal.py
+    """
+    members = [call.args[1] for call in calls if call.func in (_add_member, _remove_member)]
+    if members:
+        # Resolve every user up front in batches, so each call finds its account ID cached
+        resolver.max_workers = concurrency
+        unresolved = [user for user, account_id in resolver.resolve(members).items() if account_id is None]
+        if unresolved:
+            print(f"{len(unresolved)} users could not be resolved to an account ID", file=sys.stderr)
+
+    progress = Progress(len(calls))
+    report = run_bulk(PlannedCall.run, [(call,) for call in calls], concurrency, progress.update,
+                      journal=journal, key=lambda call: call.journal_key(command),
+                      check=PlannedCall.already_applied)
+    progress.finish()
+    skipped = sum(result.skipped for result in report.results)
+    if skipped:
+        print(f"Skipped {skipped} calls the journal records as done", file=sys.stderr)
+    for result in report.failures:
+        reason = result.error if result.error is not None else f"HTTP {result.status_code}"
+        print(f"FAILED {result.item[0]}: {reason}", file=sys.stderr)
+    return report
+
+
+def execute_teardown(calls: list[PlannedCall], command: str, concurrency: int,
+                     max_tasks: int) -> int:
+    """
+    Runs the deletions of a teardown subcommand and waits for their tasks.
+    Returns the number of failures
+    """
+    progress = Progress(len(calls))
+    keys = [call.args[0] for call in calls]
+    teardown = Teardown(concurrency, max_tasks, on_result=progress.update)
+    if command == "teardown-spaces":
+        report = teardown.run(spaces=keys)
+    else:
+        report = teardown.run(projects=keys)
+    progress.finish()
+    for result in report.failures:
+        print(f"FAILED {result.kind} {result.key}: {result.error}", file=sys.stderr)
+    return len(report.failures)
+
+
+def _configure(args):
+    configure_logging()
+    # The console shows progress instead of a log line per call, unless --verbose
+    if not args.verbose:
+        for handler in logging.getLogger().handlers:
+            if type(handler) is logging.StreamHandler:
+                handler.setLevel(logging.WARNING)
+
+    for url in (jira_url(), confluence_url()):
+        # Size each site's connection pool to the concurrency before the first
+        # request creates it, so workers don't queue for connections
+        Http.session_for(url, args.concurrency)
+        RateLimiter.for_site(url).set_max_rate(args.rate_limit)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Bulk provisioning of Jira and Confluence from CSV files")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("file", help="The CSV file to read")
+    common.add_argument("--concurrency", type=int, default=BULK_WORKERS,
+                        help=f"Requests in flight at once (default {BULK_WORKERS})")
+    common.add_argument("--rate-limit", type=float, default=RATE_LIMIT,
+                        help=f"Maximum requests per second to each site (default {RATE_LIMIT:g})")
+    common.add_argument("--dry-run", action="store_true",
+                        help="Print the planned calls and estimated request count without sending anything")
+    common.add_argument("--verbose", action="store_true", help="Log every call to the console")
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for command, (_, help_text, columns) in COMMANDS.items():
+        subparser = subparsers.add_parser(command, parents=[common], help=help_text,
+                                          description=f"{help_text}. The file needs columns: {columns}")
+        if command in TEARDOWN_COMMANDS:
+            subparser.add_argument("--max-tasks", type=int, default=TEARDOWN_MAX_TASKS,
+                                   help=f"Deletion tasks left running at once (default {TEARDOWN_MAX_TASKS})")
+        else:
+            subparser.add_argument("--journal", metavar="PATH",
+                                   help="Record each call in a journal file, and skip the calls it "
+                                        "records as done when the same run is started again")
+    args = parser.parse_args(argv)
+    if args.concurrency < 1 or args.rate_limit <= 0:
+        parser.error("--concurrency and --rate-limit must be positive")
+    return args
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    planner = COMMANDS[args.command][0]
+    calls = planner(args)
+    if args.dry_run:
+        dry_run(calls, args.concurrency, args.rate_limit)
+        return 0
+
+    _configure(args)
+    if args.command in TEARDOWN_COMMANDS:
+        failures = execute_teardown(calls, args.command, args.concurrency, args.max_tasks)
+    elif args.journal:
+        with Journal(args.journal) as journal:
+            failures = len(execute(calls, args.concurrency, args.command, journal).failures)
+    else:
+        failures = len(execute(calls, args.concurrency, args.command).failures)
+    return 1 if failures else 0
+
 
 if __name__ == "__main__":
-    ah = api.api_handler.ApiHandler(url="http://jsonplaceholder.typicode.com/posts/1")
-    ah.add_queries({
-        "hello": "world"
-    })
-    ah.get("", "Going into JSONPlaceholder...")
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""
+Shared set up for the tests. Run from the py_atlassian_accounts directory:
+    python -m pytest tests
+
+Every request is answered by one fake_server started for the whole session.
+The fake fixture gives each test a fresh FakeAtlassian behind it
+"""
+from importlib.machinery import SourceFileLoader
+from importlib.util import module_from_spec, spec_from_loader
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The tests never reach a real site, so the example settings stand in for a
+# constants.py that has not been set up
+try:
+    import constants
+except ModuleNotFoundError:
+    _loader = SourceFileLoader("constants", os.path.join(ROOT, "constants.py.example"))
+    constants = module_from_spec(spec_from_loader("constants", _loader))
+    _loader.exec_module(constants)
+    sys.modules["constants"] = constants
+
+import fake_server
+
+# Started before any api module is imported, as they build their module level
+# clients on import
+server, _ = fake_server.serve()
+BASE_URL = "http://{}:{}".format(*server.server_address)
+os.environ["JIRA_BASE_URL"] = BASE_URL
+os.environ["CONFLUENCE_BASE_URL"] = BASE_URL
+
+from api import name_index
+from api.http import Http
+from api.permission_schemes import scheme_fingerprints
+from api.rate_limit import RateLimiter
+from api.request_cache import request_cache
+from api.users import resolver
+import pytest
+
+
+@pytest.fixture
+def fake() -> fake_server.FakeAtlassian:
+    """
+    A fresh, empty FakeAtlassian answering every request of the test, with every
+    cache in the library emptied and the rate limit lifted
+    """
+    state = fake_server.FakeAtlassian()
+    server.RequestHandlerClass = fake_server.make_handler(state)
+    # Kept-alive connections are still served by the previous state's handler
+    Http.close_all()
+
+    # Also undoes any slowing down after throttled responses in earlier tests
+    RateLimiter.for_site(BASE_URL).set_max_rate(1000)
+    request_cache.clear()
+    resolver.invalidate()
+    for index in (name_index.groups, name_index.roles, name_index.permission_schemes, scheme_fingerprints):
+        index.invalidate()
+    return state
@@ -0,0 +1,35 @@
+from api.async_http import AsyncHttp, gather_results
+from api.http import POOL_SIZE, Http
+
+import asyncio
+import threading
+
+
+def test_concurrency_above_pool_size_grows_the_pool(fake, monkeypatch):
+    Http.jira().session  # The shared session, made with the default pool size
+    jira = AsyncHttp.jira(concurrency=2 * POOL_SIZE)
+
+    # Holds every request on the server until all of them have arrived, which
+    # can only happen if each has a connection of its own
+    arrived = threading.Condition()
+    waiting = []
+    all_arrived = []
+    admit = fake.admit
+
+    def admit_together():
+        with arrived:
+            waiting.append(1)
+            arrived.notify_all()
+            all_arrived.append(arrived.wait_for(lambda: len(waiting) >= 2 * POOL_SIZE, timeout=5))
+        return admit()
+
+    monkeypatch.setattr(fake, "admit", admit_together)
+
+    async def main():
+        # Distinct queries, so the request cache doesn't merge them into one
+        return await gather_results(jira.request("get", "/rest/api/3/role", queries={"n": n})
+                                    for n in range(2 * POOL_SIZE))
+
+    results = asyncio.run(main())
+    assert all(result.ok for result in results)
+    assert all_arrived == [True] * 2 * POOL_SIZE
@@ -0,0 +1,49 @@
+from api.groups import Groups
+
+import fake_server
+import pytest
+
+
+@pytest.fixture
+def fail_once(monkeypatch):
+    """
+    Makes the first call of a fake_server handler fail with a status code
+    """
+    def fail_once(handler: str, status: int):
+        handle = getattr(fake_server.Handlers, handler)
+        calls = []
+
+        def failing(*args):
+            calls.append(args)
+            if len(calls) == 1:
+                return status, {"message": "Try again"}, {"Retry-After": "0"}
+            return handle(*args)
+
+        monkeypatch.setattr(fake_server.Handlers, handler, staticmethod(failing))
+        return calls
+    return fail_once
+
+
+def test_post_is_not_retried_after_503(fake, fail_once):
+    calls = fail_once("create_group", 503)
+    assert Groups.create_group("Students").status_code == 503
+    assert len(calls) == 1
+    assert fake.groups == {}
+
+
+def test_post_is_retried_after_429(fake, fail_once):
+    calls = fail_once("create_group", 429)
+    assert Groups.create_group("Students").status_code == 201
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize("handler, call", [
+    ("list_group_members", lambda group_id: Groups.get_group_members(group_id)),
+    ("remove_user_from_group", lambda group_id: Groups.remove_user_from_group(group_id, "abc")),
+])
+def test_idempotent_methods_are_retried_after_503(fake, fail_once, handler, call):
+    fake.groups["g"] = {"name": "G", "members": {"abc"}}
+    calls = fail_once(handler, 503)
+    assert call("g").ok
+    assert len(calls) == 2
+
@@ -0,0 +1,25 @@
+from api.http import _DeferredQueueHandler
+
+import logging
+import queue
+
+
+class Body:
+    formatted = 0
+
+    def __str__(self):
+        Body.formatted += 1
+        return "{}"
+
+
+def test_records_are_queued_unformatted():
+    log_queue = queue.SimpleQueue()
+    handler = _DeferredQueueHandler(log_queue)
+    record = logging.LogRecord("api.http", logging.DEBUG, __file__, 1, "payload %s", (Body(),), None)
+
+    handler.handle(record)
+    assert Body.formatted == 0
+
+    # The listener's handlers format it on the logging thread
+    assert logging.Formatter().format(log_queue.get_nowait()) == "payload {}"
+    assert Body.formatted == 1
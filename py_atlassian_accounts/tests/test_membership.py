@@ -0,0 +1,60 @@
+from api.groups import Groups
+from api.membership_store import FETCHED, UNCHANGED, MembershipStore
+from api.pagination import JIRA_PAGE_SIZE
+
+import pytest
+
+
+@pytest.fixture
+def store():
+    with MembershipStore(":memory:") as store:
+        yield store
+
+
+@pytest.fixture
+def groups(fake):
+    """
+    One group that fits on a page and one that spans three
+    """
+    fake.seed_users(3 * JIRA_PAGE_SIZE)
+    users = sorted(fake.users)
+    fake.groups["small"] = {"name": "Small", "members": set(users[:5])}
+    fake.groups["large"] = {"name": "Large", "members": set(users[:2 * JIRA_PAGE_SIZE + 10])}
+    return users
+
+
+def test_export_fetches_each_page_once(fake, store, groups):
+    assert Groups.export_membership(["small", "large"], store) == {"small": FETCHED, "large": FETCHED}
+    assert fake.stats()["requests"] == 4
+    assert store.members("large") == fake.groups["large"]["members"]
+    assert store.member_count("large") == 2 * JIRA_PAGE_SIZE + 10
+
+
+def test_resync_skips_unchanged_groups(fake, store, groups):
+    Groups.export_membership(["small", "large"], store)
+    requests = fake.stats()["requests"]
+
+    # One page each: the small group is always re-read, the large one is compared by count
+    assert Groups.export_membership(["small", "large"], store) == {"small": FETCHED, "large": UNCHANGED}
+    assert fake.stats()["requests"] - requests == 2
+
+    fake.groups["large"]["members"].add(groups[-1])
+    assert Groups.export_membership(["large"], store) == {"large": FETCHED}
+    assert groups[-1] in store.members("large")
+
+
+def test_group_changed_while_paging_is_fetched_again(fake, store, groups, monkeypatch):
+    iter_group_members = Groups.iter_group_members
+
+    def remove_first_member(group_id, *args, **kwargs):
+        # Shifts every later member back a place, so one of them is never seen
+        fake.groups[group_id]["members"].discard(groups[0])
+        return iter_group_members(group_id, *args, **kwargs)
+
+    monkeypatch.setattr(Groups, "iter_group_members", remove_first_member)
+    Groups.export_membership(["large"], store)
+    monkeypatch.undo()
+    assert store.members("large") != fake.groups["large"]["members"]
+
+    assert Groups.export_membership(["large"], store) == {"large": FETCHED}
+    assert store.members("large") == fake.groups["large"]["members"]
@@ -0,0 +1,38 @@
+from api.permission_schemes import PermissionSchemes
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+
+def test_same_permissions_create_one_scheme(fake):
+    def get_or_create(i):
+        return PermissionSchemes().add_student_group_permissions("students") \
+            .get_or_create_permission_scheme("Student permissions", f"Scheme {i}")
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(get_or_create, range(8)))
+
+    assert len(fake.schemes) == 1
+    assert {scheme_id for scheme_id, _ in results} == set(fake.schemes)
+    assert sum(created for _, created in results) == 1
+
+
+def test_different_permissions_create_concurrently(fake, monkeypatch):
+    # Each POST waits for the other to start, which can only happen if neither
+    # holds a lock the other needs
+    both_sending = threading.Barrier(2, timeout=5)
+    create = PermissionSchemes.create_permission_scheme
+
+    def create_when_both_sending(self, *args):
+        both_sending.wait()
+        return create(self, *args)
+
+    monkeypatch.setattr(PermissionSchemes, "create_permission_scheme", create_when_both_sending)
+    schemes = [PermissionSchemes().add_student_group_permissions("students"),
+               PermissionSchemes().add_tutor_group_permissions("tutors")]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(executor.map(lambda args: args[0].get_or_create_permission_scheme("", args[1]),
+                                    zip(schemes, ["Students", "Tutors"])))
+
+    assert [created for _, created in results] == [True, True]
+    assert len(fake.schemes) == 2
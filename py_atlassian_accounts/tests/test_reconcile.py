@@ -0,0 +1,65 @@
+from api.groups import Groups
+from api.projects import Projects
+from api.reconcile import GROUP, USER, Reconciler
+
+import pytest
+
+
+@pytest.fixture
+def course(fake):
+    """
+    A group and a project role on a project, with nobody in either
+    """
+    fake.seed_users(6)
+    group_id = Groups.create_group("COMP1001 Students").json()["groupId"]
+    Projects.create_scrum_project("COMP1001", "COMP")
+    role_id = str(Projects.create_project_role("Student", "Students of the course").json()["id"])
+    return group_id, "COMP", role_id, sorted(fake.users)
+
+
+def test_second_plan_after_apply_is_empty(course):
+    group_id, project, role_id, users = course
+    reconciler = Reconciler({group_id: users[:3]}, {project: {role_id: [users[0], (GROUP, group_id)]}})
+
+    plan = reconciler.plan()
+    assert plan.request_count() == 4
+    assert reconciler.apply(plan).failures == []
+    assert not reconciler.plan()
+
+
+def test_plan_reads_past_the_request_cache(fake, course):
+    group_id, project, role_id, users = course
+    # A cached read, followed by a change made elsewhere
+    assert Projects.get_project_role_actors(project, role_id).json()["actors"] == []
+    fake.role_actors[(project, role_id)] = {(USER, users[0])}
+    fake.groups[group_id]["members"].add(users[0])
+
+    plan = Reconciler({group_id: [users[0]]}, {project: {role_id: [users[0]]}}).plan()
+    assert not plan
+
+
+def test_plan_only_adds_what_is_missing(fake, course):
+    group_id, project, role_id, users = course
+    fake.groups[group_id]["members"].update(users[:2])
+    fake.role_actors[(project, role_id)] = {(USER, users[0]), (GROUP, "admins")}
+
+    plan = Reconciler({group_id: users[1:4]}, {project: {role_id: [users[0], users[1]]}}).plan()
+    assert plan.group_adds == [(group_id, users[2]), (group_id, users[3])]
+    assert plan.role_adds == {(project, role_id): {(USER, users[1])}}
+    # Members and actors missing from the desired state are left alone by default
+    assert plan.group_removes == [] and plan.role_removes == []
+
+
+def test_prune_removes_what_is_not_desired(fake, course, caplog):
+    group_id, project, role_id, users = course
+    fake.groups[group_id]["members"].update(users[:2])
+    fake.role_actors[(project, role_id)] = {(USER, users[0]), (GROUP, "admins")}
+    reconciler = Reconciler({group_id: users[1:2]}, {project: {role_id: [users[0]]}}, prune=True)
+
+    plan = reconciler.plan()
+    assert plan.group_removes == [(group_id, users[0])]
+    assert plan.role_removes == [(project, role_id, GROUP, "admins")]
+    assert reconciler.apply(plan).failures == []
+    assert "Removing 1 group members and 1 project role actors" in caplog.text
+    assert fake.groups[group_id]["members"] == {users[1]}
+    assert fake.role_actors[(project, role_id)] == {(USER, users[0])}
@@ -0,0 +1,81 @@
+from api.groups import Groups
+from api.projects import Projects
+from api.request_cache import RequestCache
+from api.response import ApiResponse
+
+from concurrent.futures import ThreadPoolExecutor
+from requests import Response
+import pytest
+import threading
+
+URL = "https://jira.example"
+ROLE = "/rest/api/3/project/COMP/role/10002"
+
+
+def ok(body: bytes = b"{}") -> ApiResponse:
+    response = Response()
+    response.status_code = 200
+    response._content = body
+    return ApiResponse.wrap(response)
+
+
+@pytest.fixture
+def cache() -> RequestCache:
+    return RequestCache(ttls={"/rest/api/3/project/{id}/role/{id}": 30})
+
+
+def test_identical_gets_share_one_request(cache):
+    sent = []
+    release = threading.Event()
+
+    def fetch():
+        sent.append(1)
+        release.wait(5)
+        return ok()
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        futures = [executor.submit(cache.get, URL, ROLE, {}, fetch) for _ in range(5)]
+        release.set()
+        responses = {id(future.result()) for future in futures}
+    # Each caller either joined the request in flight or found its cached response
+    assert len(sent) == 1 and len(responses) == 1
+    assert cache.get(URL, ROLE, {"expand": "x"}, fetch) is not None and len(sent) == 2
+
+
+def test_write_during_a_get_stops_it_being_cached(cache):
+    def fetch():
+        cache.invalidate(URL, "/rest/api/3/project/COMP/role/10002")
+        return ok()
+
+    cache.get(URL, ROLE, {}, fetch)
+    assert len(cache) == 0
+
+
+def test_write_only_drops_its_own_resource(cache):
+    cache.get(URL, ROLE, {}, ok)
+    cache.invalidate(URL, "/rest/api/3/group/user")
+    cache.invalidate("https://other.example", "/rest/api/3/project/COMP")
+    assert len(cache) == 1
+    cache.invalidate(URL, "/rest/api/3/project/COMP")
+    assert len(cache) == 0
+
+
+def test_writes_through_http_drop_cached_reads(fake):
+    Projects.create_scrum_project("COMP1001", "COMP")
+    role_id = str(Projects.create_project_role("Student", "").json()["id"])
+
+    def actors():
+        return Projects.get_project_role_actors("COMP", role_id).json()["actors"]
+
+    assert actors() == []
+    fake.role_actors[("COMP", role_id)] = {("user", "abc")}
+    # Changes made elsewhere are not seen until the entry expires...
+    assert actors() == []
+    # ...but any change made through this library drops it at once, even one that fails
+    assert Projects.delete_user_from_project_role("COMP", role_id, "nobody").status_code == 404
+    assert actors() == [{"type": "atlassian-user-role-actor", "actorUser": {"accountId": "abc"}}]
+
+    # Writes to other resources leave it cached
+    fake.role_actors[("COMP", role_id)] = set()
+    Groups.create_group("Students")
+    assert len(actors()) == 1
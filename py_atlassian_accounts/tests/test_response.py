@@ -0,0 +1,64 @@
+from api.response import iter_json_list
+
+import json
+import pytest
+
+BODY = {
+    "startAt": 0,
+    "names": ["not [the] list", "a \"quoted\" ] bracket"],
+    "values": [
+        {"accountId": "abc", "displayName": "Zoë 中 [x]", "nested": {"values": [1, 2]}},
+        12345678901234567890,
+        -1.5e3,
+        "string, with comma",
+        None,
+        True,
+        [],
+        {},
+    ],
+    "isLast": True,
+}
+
+
+def chunked(data: bytes, size: int) -> list[bytes]:
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 10_000])
+def test_items_decode_across_chunk_boundaries(size):
+    data = json.dumps(BODY, ensure_ascii=False, indent=1).encode()
+    assert list(iter_json_list(chunked(data, size), "values")) == BODY["values"]
+
+
+@pytest.mark.parametrize("size", [1, 5, 10_000])
+def test_top_level_list(size):
+    items = [{"id": i, "name": f"item {i}"} for i in range(500)]
+    assert list(iter_json_list(chunked(json.dumps(items).encode(), size))) == items
+
+
+def test_number_split_at_chunk_end_is_not_cut_short():
+    assert list(iter_json_list([b"[1", b"23, 4", b"5]"])) == [123, 45]
+
+
+def test_empty_list():
+    assert list(iter_json_list([b'{"values": [', b" ]}"], "values")) == []
+
+
+def test_items_are_yielded_before_the_body_ends():
+    def chunks():
+        yield b'{"values": [{"a": 1}, {"b": '
+        yield b"2}"
+        raise AssertionError("read past the second item")
+
+    items = iter_json_list(chunks(), "values")
+    assert next(items) == {"a": 1}
+
+
+@pytest.mark.parametrize("data, key, message", [
+    (b'{"values": [1, 2', "values", "ended inside"),
+    (b'{"other": [1]}', "values", "No list named"),
+    (b'{"a": 1}', None, "not a JSON list"),
+])
+def test_malformed_bodies(data, key, message):
+    with pytest.raises(ValueError, match=message):
+        list(iter_json_list(chunked(data, 3), key))